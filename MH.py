@@ -11,48 +11,73 @@
 #   array
 #Delta: a value from 0 to 1
 #Epsilon: a value from 0 to 1
-#Gammas: dictionary of combination terms from binomial distribution equations,
-#    passed on to each iteration of Gibbs sampling in joint_inference.py
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py),
+#    built once in joint_inference.py and shared by every iteration of Gibbs sampling
 #Iterations: number of iterations for Metropolis-Hastings simulation, must
 #   be an integer value
 #Flag: tells which variable we're sampling for. Flag is a class of enums,
 	# either Var.DELTA, Var.EPSILON, or Var.THETA
+#mode: likelihood engine passed on to likelihoods.py (see that script for the options)
+#cache: optional LikelihoodCache (see likelihood_cache.py) passed on to pdf
+#init: optional starting value of delta/epsilon. If given, the chain continues from this value
+#   (e.g., the current state of the Gibbs sampler in joint_inference.py) instead of a random one.
+#   The log posterior at init is then recomputed from cache, since the likelihoods at the current
+#   epsilon and delta were already computed by sample_categories or the previous MH step.
+#proposal: optional Proposal (see propose_and_accept.py) for the variable being sampled
+#pool: optional VerbLikelihoodPool (see parallel_likelihoods.py) passed on to pdf
 #Conducts Metropolis-Hastings simulation over specified number of
-#   iterations: initializes a random value of delta/epsilon/theta, samples
+#   iterations: initializes a random value of delta/epsilon/theta (or starts from init), samples
 #   from a Gaussian proposal distribution to propose a new value of
 #   delta/epsilon/theta, and accepts that proposal depending on the posterior
 #   probabilities of delta/epsilon/theta and the proposed new delta/epsilon/theta given in the
 #   pdf_delta_epsilon/pdf_theta function
-#   When sampling for theta, at each iteration MH will sample a theta list (a list of theta values for each verb), so at the end it will return a list of theta lists. 
+#   When sampling for theta, at each iteration MH will sample a theta array (one theta value for each verb): it proposes for all verbs at once,
+#   evaluates them with pdf_thetas in one vectorized pass, and accepts or rejects each verb's proposal with one masked update.
+#   At the end it returns an array with one row of thetas per iteration.
+#rng: NumPy random Generator used when sampling for theta. If not given, it is seeded from the random module
 #Returns vector of delta/epsilon/theta values after running specified number of iterations
+#MH_batch runs the simulation for delta or epsilon in K chains in lockstep (see joint_inference_batch in
+#   joint_inference.py): verb_categories is a (K x verbs) array and delta, epsilon and init are arrays
+#   of the K chains' values. Every step proposes a value for each chain from rng, evaluates all K
+#   proposals with one call of pdf_batch, and accepts or rejects each chain's proposal with one masked
+#   update. It returns an (iterations x K) array. betas (1 by default, or one value per chain) raises
+#   each chain's likelihood to that power, for the tempered replicas of parallel_tempering.py.
 
 import random
-from pdf_delta_epsilon import pdf
-from pdf_theta import pdf_theta_one_verb
+from pdf_delta_epsilon import pdf, pdf_batch
+from pdf_theta import pdf_thetas
+import numpy as np
 from propose_and_accept import *
 
 
 
-def MH(data, verb_categories, delta, epsilon, gammas, iterations, flag):
+def MH(data, verb_categories, delta, epsilon, gammas, iterations, flag, mode='vectorized', cache=None, init=None, proposal=None, pool=None, rng=None):
 
 	if ((flag == Var.DELTA) or (flag == Var.EPSILON)):
-		#Initialize a random value of epsilon/delta if sampling for one of those
-		MHvar = random.random()
+		#Initialize a random value of epsilon/delta if sampling for one of those,
+		#unless the chain is continuing from a given value
+		if init is None:
+			MHvar = random.random()
+		else:
+			MHvar = init
 		sampled_results = [MHvar]
 	else:
-		#initialize a random value of theta for each verb if sampling for theta
-		thetas = [random.random() for i in range(0, len(data))]
+		#initialize a random value of theta for each verb if sampling for theta,
+		#kept together in one array
+		if rng is None:
+			rng = np.random.default_rng(random.getrandbits(64))
+		thetas = rng.random(len(data))
 		sampled_results = [thetas]
 
 
 		#Determine whether the variable being sampled with MH sampling is delta, epsilon, or theta
 		#Use pdf to calculate logs of height of relevant variable on curve proportional to pdf over the sampled variable
 	if flag == Var.DELTA:
-		p_MHvar = pdf(data, verb_categories, MHvar, epsilon, gammas)
+		p_MHvar = pdf(data, verb_categories, MHvar, epsilon, gammas, mode, cache, pool)
 	elif flag == Var.EPSILON:
-		p_MHvar = pdf(data, verb_categories, delta, MHvar, gammas)
+		p_MHvar = pdf(data, verb_categories, delta, MHvar, gammas, mode, cache, pool)
 	else:
-		p_thetas = [pdf_theta_one_verb(data[j], delta, epsilon, thetas[j], gammas) for j in range(0, len(thetas))]
+		p_thetas = pdf_thetas(data, delta, epsilon, thetas)
 
 
 	for i in range(1, iterations):
@@ -60,17 +85,71 @@ def MH(data, verb_categories, delta, epsilon, gammas, iterations, flag):
 		#the initial random samples the 'first' iteration rather than the first time this loop runs.
 		if ((flag == Var.DELTA) or (flag == Var.EPSILON)):
 			#if we are using MH sampling for epsilon or delta, just call propose_and_accept one time per iteration
-			result = propose_and_accept(data, verb_categories, delta, epsilon, gammas, MHvar, p_MHvar, flag)
+			result = propose_and_accept(data, verb_categories, delta, epsilon, gammas, MHvar, p_MHvar, flag, mode, cache, proposal, pool)
 			MHvar = result[0] #since propose_and_accept returns a tuple, set first element in tuple as MHvar
 			p_MHvar = result[1] #set second element in tuple as p_MHvar
 			#add the result to the sampled_results list
 			sampled_results.append(MHvar)
 		#this function returns a new MHvar
 		else:
-			#for theta, call propose_and_accept on each theta value (ie, for each verb)
-			result = [propose_and_accept(data[j], verb_categories, delta, epsilon, gammas, thetas[j], p_thetas[j], flag) for j in range(0, len(thetas))]
-			thetas = [i[0] for i in result] #propose_and_accept returns a list of tuples, set first element of each tuple as thetas list
-			p_thetas = [i[1] for i in result] #set second element of each tuple as p_thetas list
+			#for theta, propose a new value for every verb at once, from a Gaussian with sigma = 0.25 unless a Proposal is given
+			if proposal is None:
+				thetas_prime = rng.normal(thetas, 0.25)
+				correction = 0.0
+			else:
+				thetas_prime, correction = proposal.propose_batch(thetas, rng)
+			p_thetas_prime = pdf_thetas(data, delta, epsilon, thetas_prime)
+
+			#accept each verb's proposal with probability f(new theta)/f(old theta), in log space, as one masked update
+			with np.errstate(invalid='ignore'):
+				accepted = np.log(rng.random(len(thetas))) < p_thetas_prime - p_thetas + correction
+			thetas = np.where(accepted, thetas_prime, thetas)
+			p_thetas = np.where(accepted, p_thetas_prime, p_thetas)
+			if proposal is not None:
+				proposal.update_batch(accepted)
 			sampled_results.append(thetas) #add the accepted thetas to results list
 
+	if flag == Var.THETA:
+		return np.array(sampled_results)
 	return sampled_results
+
+def MH_batch(data, verb_categories, delta, epsilon, gammas, iterations, flag, rng, mode='collapsed', cache=None, init=None, proposal=None, betas=1.0):
+
+	delta = np.asarray(delta, dtype=float)
+	epsilon = np.asarray(epsilon, dtype=float)
+	chains = len(epsilon)
+
+	#Initialize a random value for each chain, unless the chains are continuing from given values
+	if init is None:
+		MHvars = rng.random(chains)
+	else:
+		MHvars = np.array(init, dtype=float)
+	sampled_results = [MHvars]
+
+	def batch_pdf(values):
+		if flag == Var.DELTA:
+			return betas*pdf_batch(data, verb_categories, values, epsilon, gammas, mode, cache)
+		return betas*pdf_batch(data, verb_categories, delta, values, gammas, mode, cache)
+
+	p_MHvars = batch_pdf(MHvars)
+
+	for i in range(1, iterations):
+		#propose a new value for every chain at once, from a Gaussian with sigma = 0.25 unless a Proposal is given
+		if proposal is None:
+			MHvars_prime = rng.normal(MHvars, 0.25)
+			correction = 0.0
+		else:
+			MHvars_prime, correction = proposal.propose_batch(MHvars, rng)
+		p_MHvars_prime = batch_pdf(MHvars_prime)
+
+		#accept each chain's proposal with probability f(new value)/f(old value), in log space;
+		#proposals outside (0, 1) have zero probability and are always rejected
+		with np.errstate(invalid='ignore'):
+			accepted = (p_MHvars_prime > float('-inf')) & (np.log(rng.random(chains)) < p_MHvars_prime - p_MHvars + correction)
+		MHvars = np.where(accepted, MHvars_prime, MHvars)
+		p_MHvars = np.where(accepted, p_MHvars_prime, p_MHvars)
+		if proposal is not None:
+			proposal.update_batch(accepted)
+		sampled_results.append(MHvars)
+
+	return np.array(sampled_results)
@@ -0,0 +1,170 @@
+#Benchmarks the main steps of the model on synthetic corpora (see synthetic_data.py) over grids of
+#   numbers of verbs V and of observations per verb n, and stores the timings as a JSON baseline
+#   that later runs can be compared against, to catch performance regressions between commits.
+#Targets:
+#   likelihoods: p(k|T,epsilon,delta) of one verb (likelihoods.py)
+#   pdf: height of the posterior on epsilon/delta for all V verbs (pdf_delta_epsilon.py)
+#   pdf_theta_one_verb: height of the posterior on theta for one verb (pdf_theta.py)
+#   sample_categories: one draw of the categories of all V verbs (sample_categories.py)
+#   gibbs_iteration: one full iteration of joint_inference.py
+#Each cell of the grid is timed repeatedly until its time budget is used up, and the median time
+#   of one call is recorded. Cells whose estimated work is above max_work (roughly, terms of the
+#   (n1, k1) sums) are recorded as skipped instead of being run.
+#Usage:
+#   python benchmark.py run baseline.json [--verbs 10 100 ...] [--observations 10 100 ...]
+#       [--targets likelihoods pdf ...] [--mode vectorized] [--budget 1.0] [--max-work 1e9]
+#   python benchmark.py compare baseline.json current.json [--threshold 1.2]
+#compare reports the ratio of current to baseline time for every cell in both files, and exits
+#   with status 1 if any cell is slower than threshold times its baseline.
+
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+from synthetic_data import generate_corpus
+from log_choose import build_gammas
+
+VERBS = [10, 100, 1000, 10000]
+OBSERVATIONS = [10, 100, 1000, 10000, 50000]
+TARGETS = ['likelihoods', 'pdf', 'pdf_theta_one_verb', 'sample_categories', 'gibbs_iteration']
+
+## rough number of terms summed for one verb with n observations, times a factor for the Python loops
+def verb_work(n, mode):
+    if mode == 'collapsed':
+        return 1.0
+    if str(mode).startswith('truncated'):
+        return n*np.sqrt(n)
+    return n*n/2*(50 if mode == 'sum' else 1)
+
+def estimated_work(target, nverbs, n, mode):
+    if target in ('likelihoods', 'pdf_theta_one_verb'):
+        return verb_work(n, mode)
+    if target == 'gibbs_iteration':
+        ## a category draw and two MH simulations of 10 steps
+        return 21*nverbs*verb_work(n, mode)
+    return nverbs*verb_work(n, mode)
+
+## returns a function of no arguments that runs the target once on data
+def benchmark_call(target, data, truth, gammas, mode, seed):
+    if target == 'likelihoods':
+        from likelihoods import likelihoods
+        return lambda: likelihoods(data[0], truth['delta'], truth['epsilon'], gammas, {}, {}, {}, mode)
+    if target == 'pdf':
+        from pdf_delta_epsilon import pdf
+        return lambda: pdf(data, truth['categories'], truth['delta'], truth['epsilon'], gammas, mode)
+    if target == 'pdf_theta_one_verb':
+        from pdf_theta import pdf_theta_one_verb
+        return lambda: pdf_theta_one_verb(data[0], truth['delta'], truth['epsilon'], 0.5, gammas, mode=mode)
+    if target == 'sample_categories':
+        from sample_categories import sample_categories
+        return lambda: sample_categories(data, truth['epsilon'], truth['delta'], gammas, mode)
+    if target == 'gibbs_iteration':
+        from joint_inference import joint_inference
+        return lambda: joint_inference(data, 1, mode=mode, seed=seed, gammas=gammas, verbose=False)
+    raise ValueError('Invalid benchmark target: ' + str(target))
+
+## median time of one call, and the number of calls made within the budget (at least one)
+def time_call(function, budget):
+    times = []
+    started = time.perf_counter()
+    while not times or time.perf_counter() - started < budget:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), len(times)
+
+def run_benchmarks(verbs=VERBS, observations=OBSERVATIONS, targets=TARGETS, mode='vectorized', budget=1.0,
+                   max_work=1e9, seed=0, report=print):
+    results = []
+    for n in observations:
+        for nverbs in verbs:
+            data = None
+            for target in targets:
+                ## targets on one verb only need to run once for each n
+                if target in ('likelihoods', 'pdf_theta_one_verb') and nverbs != verbs[0]:
+                    continue
+                cell = {'target': target, 'verbs': 1 if target in ('likelihoods', 'pdf_theta_one_verb') else nverbs,
+                        'observations': n, 'mode': mode}
+
+                if estimated_work(target, cell['verbs'], n, mode) > max_work:
+                    cell['status'] = 'skipped'
+                else:
+                    if data is None:
+                        data, truth = generate_corpus(nverbs, n, seed=seed)
+                        gammas = build_gammas(data)
+                    cell['seconds'], cell['repeats'] = time_call(benchmark_call(target, data, truth, gammas, mode, seed), budget)
+                    cell['status'] = 'ok'
+
+                results.append(cell)
+                if report is not None:
+                    report(cell)
+    return results
+
+## description of the machine and commit the benchmarks ran on
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=1)
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+## ratio of current to baseline time for every cell timed in both, and the cells slower than threshold times
+def compare(baseline, current, threshold=1.2):
+    key = lambda cell: (cell['target'], cell['verbs'], cell['observations'], cell['mode'])
+    before = {key(cell): cell for cell in baseline['results'] if cell['status'] == 'ok'}
+
+    rows = []
+    for cell in current['results']:
+        if cell['status'] != 'ok' or key(cell) not in before:
+            continue
+        ratio = cell['seconds']/before[key(cell)]['seconds']
+        rows.append(dict(cell, baseline_seconds=before[key(cell)]['seconds'], ratio=ratio, regression=ratio > threshold))
+
+    return rows, [row for row in rows if row['regression']]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the noise-filter model on synthetic corpora.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='time a grid of benchmarks and save them as a baseline')
+    run.add_argument('output')
+    run.add_argument('--verbs', type=int, nargs='+', default=VERBS)
+    run.add_argument('--observations', type=int, nargs='+', default=OBSERVATIONS)
+    run.add_argument('--targets', nargs='+', default=TARGETS, choices=TARGETS)
+    run.add_argument('--mode', default='vectorized')
+    run.add_argument('--budget', type=float, default=1.0, help='seconds spent timing each cell')
+    run.add_argument('--max-work', type=float, default=1e9)
+    run.add_argument('--seed', type=int, default=0)
+
+    comparison = commands.add_parser('compare', help='compare a run against a baseline')
+    comparison.add_argument('baseline')
+    comparison.add_argument('current')
+    comparison.add_argument('--threshold', type=float, default=1.2)
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'run':
+        report = lambda cell: print(json.dumps(cell))
+        results = run_benchmarks(arguments.verbs, arguments.observations, arguments.targets, arguments.mode,
+                                 arguments.budget, arguments.max_work, arguments.seed, report)
+        save_baseline(arguments.output, results)
+
+    else:
+        rows, regressions = compare(load_baseline(arguments.baseline), load_baseline(arguments.current), arguments.threshold)
+        for row in rows:
+            print('%-20s V=%-6d n=%-6d %-10s %10.6fs -> %10.6fs  x%.2f%s' % (row['target'], row['verbs'], row['observations'],
+                  row['mode'], row['baseline_seconds'], row['seconds'], row['ratio'], '  REGRESSION' if row['regression'] else ''))
+        sys.exit(1 if regressions else 0)
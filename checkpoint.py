@@ -0,0 +1,70 @@
+#Checkpoints the full state of a joint_inference.py run, so that a run that is killed (e.g., on a
+#   preemptible batch node) can be resumed from its last checkpoint and continue exactly as if it
+#   had never stopped.
+#The state holds the current categories, epsilon and delta (and all samples so far, or the position
+#   in the TraceStore if the run writes one, see trace_store.py), the states of the random module
+#   and of the NumPy random Generator, the iteration counter, the proposals with their adapted widths,
+#   and the data and settings of the run (including verbose, so a resumed quiet run stays quiet).
+#Checkpoints are pickled to a temporary file that then replaces the checkpoint file, so a crash
+#   while writing leaves the previous checkpoint intact.
+#Path: checkpoint file
+#every: write a checkpoint after every this many iterations
+#seconds: write a checkpoint once at least this many seconds have passed since the last one
+#Pass Checkpointer(path, every, seconds) to joint_inference as checkpoint, and call resume(path)
+#   to continue the run. resume returns the same values as joint_inference.
+#The likelihood cache is not saved: its values are recomputed exactly, so it only changes the speed.
+#An Instrumentation is not saved either, and a resumed run is not instrumented.
+
+import os
+import time
+import pickle
+from joint_inference import joint_inference
+from trace_store import TraceStore
+
+## pickles state to path atomically
+def save_checkpoint(path, state):
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+class Checkpointer:
+
+    def __init__(self, path, every=None, seconds=None):
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.last = time.time()
+
+    ## whether a checkpoint is due at the end of this iteration
+    def due(self, iteration):
+        if self.every is not None and (iteration + 1) % self.every == 0:
+            return True
+        return self.seconds is not None and time.time() - self.last >= self.seconds
+
+    def save(self, state):
+        state['checkpoint'] = {'every': self.every, 'seconds': self.seconds}
+        save_checkpoint(self.path, state)
+        self.last = time.time()
+
+## continues the run saved in the checkpoint at path, up to iterations (by default, the number of
+## iterations it was started with), and keeps checkpointing to the same file
+def resume(path, iterations=None):
+    state = load_checkpoint(path)
+
+    trace = None
+    if state['trace'] is not None:
+        trace = TraceStore.open(state['trace']['directory'], 'r+')
+        ## samples written after the checkpoint are overwritten
+        trace.count = state['trace']['count']
+
+    checkpoint = Checkpointer(path, **state['checkpoint'])
+
+    return joint_inference(state['data'], iterations or state['iterations'], trace=trace,
+                           checkpoint=checkpoint, state=state, **state['settings'])
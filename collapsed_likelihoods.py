@@ -0,0 +1,152 @@
+#Calculates p(k|T,epsilon,delta) for one verb over all three transitivity categories in closed form,
+#   without the (n1, k1) double sum of Equation (8) in Perkins, Feldman & Lidz.
+#Each observation is signal with probability 1-epsilon (a direct object with probability theta)
+#   or noise with probability epsilon (a direct object with probability delta). Summing over n1 and k1
+#   therefore leaves k ~ Binomial(n, p) with p = (1-epsilon)*theta + epsilon*delta, so:
+#   1: transitive (theta = 1): p = 1 - epsilon + epsilon*delta
+#   2: intransitive (theta = 0): p = epsilon*delta
+#   3: alternating (theta ~ Beta(1,1)): integrating the binomial over theta gives
+#      [I_u(k+1, n-k+1) - I_l(k+1, n-k+1)] / ((1-epsilon)(n+1)), where I is the regularized
+#      incomplete beta function, l = epsilon*delta and u = 1 - epsilon + epsilon*delta
+#verb: a 2-element list. The first element contains counts of direct objects
+#   and the second contains total number of observations
+#Delta: a value from 0 to 1
+#Epsilon: a value from 0 to 1
+#k, n, delta, epsilon in collapsed_log_likelihoods may also be NumPy arrays, which are broadcast
+#   against each other, so many verbs or many (epsilon, delta) values are computed in one call
+#Returns a 3-element vector of log likelihoods of the given verb over three verb categories
+#collapsed_theta_likelihood returns p(k|theta, epsilon, delta) for a given theta instead of a category,
+#   the binomial probability of k with p = (1-epsilon)*theta + epsilon*delta
+
+import numpy as np
+from scipy.special import betainc, betaincc, gammaln, xlogy, xlog1py
+from vectorized_likelihoods import logsumexp
+
+## incomplete beta values below this are recomputed in log space, since they may have underflowed
+TINY = 1e-280
+## T3 is averaged over [l, u] by Gauss-Legendre quadrature when u - l = 1 - epsilon is below NARROW, since
+## the difference of incomplete beta functions then cancels, but only where the pmf is nearly flat over
+## [l, u]: (u - l) times the largest slope k/x + (n-k)/(1-x) of its log (at l or u) at most FLAT. A pmf
+## peaked at one end of [l, u] is left to the incomplete beta functions, which do not cancel there
+NARROW = 1e-3
+FLAT = 1.0
+NODES, WEIGHTS = np.polynomial.legendre.leggauss(16)
+## largest difference of log likelihoods from the summation allowed by the check below
+TOLERANCE = 1e-9
+
+## log of the binomial pmf, p(k|n, p), with q = 1 - p if it can be computed more precisely than 1 - p
+def binomial_logpmf(k, n, p, q=None):
+    if q is None:
+        return gammaln(n+1) - gammaln(k+1) - gammaln(n-k+1) + xlogy(k, p) + xlog1py(n-k, -p)
+    return gammaln(n+1) - gammaln(k+1) - gammaln(n-k+1) + xlogy(k, p) + xlogy(n-k, q)
+
+## log of the binomial tail sum of p(j|n+1, x) over j = k+1, ..., n+1 (upper=True),
+## or over j = 0, ..., k (upper=False), computed term by term in log space
+## equal to log I_x(k+1, n-k+1) for upper=True and log(1 - I_x(k+1, n-k+1)) for upper=False
+def log_binomial_tail(k, n, x, upper):
+    j = np.arange(k+1, n+2) if upper else np.arange(0, k+1)
+    return float(logsumexp(binomial_logpmf(j, n+1, x)))
+
+## log(I_u - I_l) for the regularized incomplete beta I(k+1, n-k+1), with l <= u
+## uses the lower tails if l is in the lower half of the distribution and the upper tails
+## otherwise, to avoid cancellation, and falls back to log-space tail sums where a
+## value has underflowed
+def log_beta_difference(k, n, lower, upper):
+    shape = np.broadcast(k, n, lower, upper).shape
+    k, n, lower, upper = [np.broadcast_to(x, shape).ravel() for x in (k, n, lower, upper)]
+    a = k + 1.0
+    b = n - k + 1.0
+    Ilower = betainc(a, b, lower)
+    use_cdf = Ilower <= 0.5
+    big = np.where(use_cdf, betainc(a, b, upper), betaincc(a, b, lower))
+    small = np.where(use_cdf, Ilower, betaincc(a, b, upper))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logbig = np.log(big)
+        logsmall = np.log(small)
+
+    ## redo underflowed tail values in log space
+    for index in np.flatnonzero((big < TINY) | ((small < TINY) & (small > 0))):
+        kk, nn = int(k[index]), int(n[index])
+        if use_cdf[index]:
+            logbig[index] = log_binomial_tail(kk, nn, upper[index], True)
+            logsmall[index] = log_binomial_tail(kk, nn, lower[index], True)
+        else:
+            logbig[index] = log_binomial_tail(kk, nn, lower[index], False)
+            logsmall[index] = log_binomial_tail(kk, nn, upper[index], False)
+
+    ## log(big - small) = log(big) + log(1 - small/big)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = logbig + np.log1p(-np.exp(logsmall - logbig))
+    return np.where(logsmall == float('-inf'), logbig, result).reshape(shape)
+
+## closed-form log likelihoods over the three categories, stacked along the last axis
+def collapsed_log_likelihoods(k, n, delta, epsilon):
+    k, n, delta, epsilon = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (k, n, delta, epsilon)])
+
+    lower = epsilon*delta
+    upper = 1 - epsilon + epsilon*delta
+    ## 1 - upper = epsilon*(1-delta), which keeps its precision when epsilon is small
+    T1likelihood = binomial_logpmf(k, n, upper, epsilon*(1-delta))
+    T2likelihood = binomial_logpmf(k, n, lower)
+
+    signal = 1 - epsilon
+    with np.errstate(divide='ignore'):
+        T3likelihood = np.array(log_beta_difference(k, n, lower, upper) - np.log(signal) - np.log(n+1))
+
+    ## for a narrow [l, u] over which the pmf is nearly flat, the mean of the pmf over [l, u] by quadrature instead
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.maximum(k/lower + (n-k)/(1-lower), k/upper + (n-k)/(epsilon*(1-delta)))
+    narrow = (signal > 0) & (signal < NARROW) & (signal*np.nan_to_num(slope, nan=np.inf) <= FLAT)
+    if np.any(narrow):
+        x = lower[narrow][:, None] + signal[narrow][:, None]*(NODES + 1)/2
+        complement = epsilon[narrow][:, None]*(1-delta[narrow][:, None]) + signal[narrow][:, None]*(1 - NODES)/2
+        pmf = binomial_logpmf(k[narrow][:, None], n[narrow][:, None], x, complement)
+        T3likelihood[narrow] = logsumexp(pmf + np.log(WEIGHTS/2), axis=1)
+
+    ## with epsilon = 1 every observation is noise, and all three categories agree
+    T3likelihood = np.where(signal > 0, T3likelihood, T1likelihood)
+
+    return np.stack([T1likelihood, T2likelihood, T3likelihood], axis=-1)
+
+def collapsed_likelihoods(verb, delta, epsilon):
+    return [float(x) for x in collapsed_log_likelihoods(verb[0], verb[1], delta, epsilon)]
+
+def collapsed_theta_likelihood(verb, delta, epsilon, theta):
+    return float(binomial_logpmf(verb[0], verb[1], (1-epsilon)*theta + epsilon*delta, (1-epsilon)*(1-theta) + epsilon*(1-delta)))
+
+## largest absolute difference (in log space) between the collapsed likelihoods and another
+## engine from likelihoods.py, over every verb in data and every (delta, epsilon) pair given
+def compare_to_summation(data, parameters, mode='sum'):
+    from likelihoods import likelihoods
+    from log_choose import build_gammas
+
+    gammas = build_gammas(data)
+    worst = 0.0
+    for delta, epsilon in parameters:
+        for verb in data:
+            closed = collapsed_likelihoods(verb, delta, epsilon)
+            summed = likelihoods(verb, delta, epsilon, gammas, {}, {}, {}, mode)
+            for x, y in zip(closed, summed):
+                if x == float('-inf') or y == float('-inf'):
+                    if x != y:
+                        return float('inf')
+                else:
+                    worst = max(worst, abs(x - y))
+    return worst
+
+## check the closed form against the summation on Test_data.xlsx-sized and CHILDES-sized counts,
+## and exit with status 1 if any log likelihood differs by more than TOLERANCE
+if __name__ == '__main__':
+    import sys
+    toy = [[19, 20], [9, 10], [1, 20], [2, 40], [10, 20], [3, 10], [10, 10], [0, 15], [0, 0]]
+    childes = [[308, 1568], [777, 1318], [11, 859], [541, 605], [3, 605], [205, 220]]
+    parameters = [(0.5, 0.1), (0.5, 0.95), (0.05, 0.4), (0.9, 0.01), (0.3, 0.6)]
+
+    passed = True
+    for name, verbs, values in (('Test_data-sized', toy, parameters), ('CHILDES-sized', childes, parameters[:2])):
+        worst = compare_to_summation(verbs, values, 'sum')
+        passed = passed and worst <= TOLERANCE
+        print('%s counts, largest difference: %.3g (tolerance %.0e)  %s' % (name, worst, TOLERANCE,
+              'ok' if worst <= TOLERANCE else 'FAILED'))
+    sys.exit(0 if passed else 1)
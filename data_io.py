@@ -0,0 +1,115 @@
+#Loads verb count data from files, in the format of the data vector in joint_inference.py:
+#   a list of [k, n] counts for each verb, with k the count of direct objects and n the total count.
+#Supported files:
+#   .csv, .tsv, .txt: one verb per row, with the columns k and n, or verb, k and n. A header row, blank
+#       lines and lines starting with # are skipped. Columns are split on commas, tabs or spaces.
+#   .csv.gz, .tsv.bz2, .txt.xz, ...: the same, compressed (e.g. count tables written by ingest.py)
+#   .xlsx: either the test datasets of Test_data.xlsx (rows like "Data = [19, 20; 9, 10; ...]",
+#       followed by "Actual Epsilon = ..." and "Actual Models = [...]"), or a sheet with one verb per
+#       row as above. Requires openpyxl.
+#path: data file
+#test: for files with several test datasets, the one to load, by number (1 for "Test 1") or name
+#   (the first one by default)
+#sheet: name of the .xlsx sheet to read (the first one by default)
+#load_data returns the list of counts; load_verbs also returns the verb names (None for unnamed rows)
+#read_tests returns every test dataset in a file as a dictionary with its name, data, and the actual
+#   epsilon and models where given
+
+import os
+import re
+import gzip
+import bz2
+import lzma
+
+## opens a text file for reading ('r') or writing ('w'), compressed if its name ends in .gz, .bz2 or .xz
+def open_text(path, mode='r'):
+    opener = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}.get(os.path.splitext(path)[1].lower())
+    if opener is not None:
+        return opener(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+## extension of a file, without the compression extension
+def data_extension(path):
+    root, extension = os.path.splitext(path)
+    if extension.lower() in ('.gz', '.bz2', '.xz'):
+        extension = os.path.splitext(root)[1]
+    return extension.lower()
+
+## "Data = [19, 20; 9, 10]" -> [[19, 20], [9, 10]]
+def parse_matrix(text):
+    inside = text[text.index('[')+1:text.rindex(']')]
+    return [[int(float(value)) for value in re.split(r'[,\s]+', row.strip())] for row in inside.split(';') if row.strip()]
+
+## rows of cell values (strings or numbers) of a file
+def read_rows(path, sheet=None):
+    extension = data_extension(path)
+
+    if extension in ('.xlsx', '.xlsm'):
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = [[cell for cell in row if cell is not None] for row in worksheet.iter_rows(values_only=True)]
+        workbook.close()
+        return [row for row in rows if row]
+
+    separator = '\t' if extension == '.tsv' else None
+    rows = []
+    with open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if separator is None:
+                rows.append([cell for cell in re.split(r'[,\s]+', line) if cell])
+            else:
+                rows.append([cell.strip() for cell in line.split(separator)])
+    return rows
+
+def read_tests(path, sheet=None):
+    tests = []
+    for row in read_rows(path, sheet):
+        text = ' '.join(str(cell) for cell in row).strip()
+        lowered = text.lower()
+        if re.match(r'test\s*\d+$', lowered):
+            tests.append({'name': text, 'data': None, 'epsilon': None, 'models': None})
+        elif lowered.startswith('data') and '[' in text:
+            if not tests:
+                tests.append({'name': 'Test 1', 'data': None, 'epsilon': None, 'models': None})
+            tests[-1]['data'] = parse_matrix(text)
+        elif lowered.startswith('actual epsilon') and tests:
+            tests[-1]['epsilon'] = float(text.split('=')[1])
+        elif lowered.startswith('actual models') and tests:
+            tests[-1]['models'] = parse_matrix(text)[0]
+    return [test for test in tests if test['data'] is not None]
+
+def load_verbs(path, test=None, sheet=None):
+    tests = read_tests(path, sheet) if data_extension(path) in ('.xlsx', '.xlsm') else []
+
+    if tests:
+        if test is None:
+            chosen = tests[0]
+        else:
+            matches = [t for t in tests if str(test).lower() in (t['name'].lower(), t['name'].lower().replace('test', '').strip())]
+            if not matches:
+                raise ValueError('No test dataset ' + str(test) + ' in ' + path)
+            chosen = matches[0]
+        return [None]*len(chosen['data']), chosen['data']
+
+    names = []
+    data = []
+    for row in read_rows(path, sheet):
+        if len(row) < 2:
+            raise ValueError('Expected k and n counts in row: ' + str(row))
+        try:
+            counts = [int(float(cell)) for cell in row[-2:]]
+        except ValueError:
+            ## header row
+            continue
+        if counts[0] > counts[1] or counts[0] < 0:
+            raise ValueError('Invalid counts (k must be between 0 and n) in row: ' + str(row))
+        names.append(str(row[0]) if len(row) > 2 else None)
+        data.append(counts)
+    return names, data
+
+def load_data(path, test=None, sheet=None):
+    return load_verbs(path, test, sheet)[1]
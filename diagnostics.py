@@ -0,0 +1,203 @@
+#Convergence and efficiency diagnostics for the samples produced by joint_inference.py
+#samples: a list or array of successive values of one variable (e.g., epsilon) from one chain
+#effective_sample_size: number of independent samples carrying the same information as the
+#   correlated chain, n / (1 + 2*sum of autocorrelations), with the autocorrelation sum truncated
+#   by Geyer's initial monotone sequence
+#potential_scale_reduction: Gelman-Rubin R-hat of several chains of the same variable;
+#   values close to 1 mean that the chains agree
+#ConvergenceMonitor: diagnostics updated online as joint_inference runs, used to stop the chain early
+#   once they meet set thresholds (pass it to joint_inference as monitor)
+#compare_mh_kernels: runs joint_inference with several sampler settings and reports
+#   effective samples per second of epsilon and delta for each of them
+
+import time
+import random
+import numpy as np
+
+def autocorrelation(samples):
+    x = np.asarray(samples, dtype=float)
+    x = x - x.mean()
+    n = len(x)
+    ## autocovariance at every lag from one FFT, zero-padded to avoid wrap-around
+    f = np.fft.rfft(x, 2*n)
+    acov = np.fft.irfft(f*np.conj(f))[:n]/n
+    return acov/acov[0]
+
+def effective_sample_size(samples):
+    n = len(samples)
+    if n < 4 or np.var(samples) == 0:
+        return float('nan')
+
+    rho = autocorrelation(samples)
+
+    ## Geyer: sum autocorrelations in consecutive pairs while the pair sums stay positive,
+    ## and force the pair sums to be non-increasing
+    tau = -1.0
+    previous = float('inf')
+    for lag in range(0, n-1, 2):
+        pair = rho[lag] + rho[lag+1]
+        if pair <= 0:
+            break
+        previous = min(previous, pair)
+        tau += 2*previous
+
+    return float(n/tau)
+
+## chains: a list of equally long sample lists, one per chain
+## split: if True, each chain is also split in half, so trends within a chain show up as well (split-R-hat)
+def potential_scale_reduction(chains, split=False):
+    chains = np.asarray(chains, dtype=float)
+    if split:
+        half = chains.shape[1]//2
+        chains = np.concatenate([chains[:, :half], chains[:, half:2*half]])
+    m, n = chains.shape
+    if m < 2 or n < 2:
+        return float('nan')
+
+    within = chains.var(axis=1, ddof=1).mean()
+    between = n*chains.mean(axis=1).var(ddof=1)
+    if within == 0:
+        return float('nan')
+    pooled = (n-1)/n*within + between/n
+    return float(np.sqrt(pooled/within))
+
+## Online diagnostics over the second half of the chain so far (the first half is treated as burn-in).
+## Each iteration appends to prefix sums of epsilon, delta and their squares, so that every check costs
+## O(sqrt(n)) for the batch-means ESS and O(1) for the split-R-hat, instead of a pass over the chain.
+## Category counts are added up at each check, and the stability of the category frequencies is the
+## largest change of any verb's frequency of any category since the previous check.
+## min_ess: smallest batch-means effective sample size of epsilon and delta for stopping
+## max_rhat: largest split-R-hat (two halves of the window) of epsilon and delta for stopping
+## max_category_change: largest change of a category frequency between checks for stopping
+## min_iterations: the chain is never stopped before this many iterations
+## check_every: the diagnostics are computed, and stopping is considered, every this many iterations
+## trajectory: one dictionary of diagnostics per check
+class ConvergenceMonitor:
+
+    def __init__(self, min_ess=200, max_rhat=1.01, max_category_change=0.02, min_iterations=100, check_every=10):
+        self.min_ess = min_ess
+        self.max_rhat = max_rhat
+        self.max_category_change = max_category_change
+        self.min_iterations = min_iterations
+        self.check_every = check_every
+        self.sums = {'epsilon': [0.0], 'delta': [0.0]}
+        self.squares = {'epsilon': [0.0], 'delta': [0.0]}
+        ## (number of samples, cumulative category counts) at the checks that can still start the window
+        self.counts = []
+        self.running = None
+        self.frequencies = None
+        self.trajectory = []
+
+    ## batch-means effective sample size of samples start to end - 1, from the prefix sums
+    def batch_means_ess(self, name, start, end):
+        n = end - start
+        size = int(np.sqrt(n))
+        batches = n//size if size else 0
+        if batches < 2:
+            return float('nan')
+        ## the prefix sums are indexed in place, at the batch edges only, so a check does not copy them
+        sums = self.sums[name]
+        squares = self.squares[name]
+        mean = (sums[end] - sums[start])/n
+        variance = ((squares[end] - squares[start]) - n*mean*mean)/(n-1)
+        batchmeans = np.diff([sums[start + size*batch] for batch in range(batches+1)])/size
+        batchvariance = size*batchmeans.var(ddof=1)
+        if batchvariance <= 0 or variance <= 0:
+            return float('nan')
+        return float(n*variance/batchvariance)
+
+    ## split-R-hat of samples start to end - 1, with the two halves as chains
+    def split_rhat(self, name, start, end):
+        half = (end - start)//2
+        if half < 2:
+            return float('nan')
+        sums = self.sums[name]
+        squares = self.squares[name]
+        means = []
+        variances = []
+        for first in (start, start + half):
+            mean = (sums[first + half] - sums[first])/half
+            means.append(mean)
+            variances.append(((squares[first + half] - squares[first]) - half*mean*mean)/(half-1))
+        within = np.mean(variances)
+        between = half*np.var(means, ddof=1)
+        if within <= 0:
+            return float('nan')
+        return float(np.sqrt(((half-1)/half*within + between/half)/within))
+
+    ## adds the state at the end of an iteration; returns True when the chain can stop
+    def update(self, iteration, categories, epsilon, delta):
+        for name, value in (('epsilon', epsilon), ('delta', delta)):
+            self.sums[name].append(self.sums[name][-1] + value)
+            self.squares[name].append(self.squares[name][-1] + value*value)
+
+        categories = np.asarray(categories)
+        counts = np.stack([categories == category for category in (1, 2, 3)], axis=1).astype(np.int64)
+        self.running = counts if self.running is None else self.running + counts
+
+        n = len(self.sums['epsilon']) - 1
+        if n % self.check_every:
+            return False
+        self.counts.append((n, self.running.copy()))
+
+        ## window: second half of the chain so far, starting at the nearest check for the category counts
+        start = n//2
+        ## the window start only moves forward, so a check before the last one at or before it
+        ## can never be the nearest again
+        while len(self.counts) > 1 and self.counts[1][0] <= start:
+            self.counts.pop(0)
+        first, firstcounts = min(self.counts, key=lambda check: abs(check[0] - start))
+        frequencies = (self.running - firstcounts)/max(n - first, 1)
+        change = float('nan') if self.frequencies is None else float(np.abs(frequencies - self.frequencies).max())
+        self.frequencies = frequencies
+
+        diagnostics = {'iteration': iteration, 'samples': n - start,
+                       'ess_epsilon': self.batch_means_ess('epsilon', start, n),
+                       'ess_delta': self.batch_means_ess('delta', start, n),
+                       'rhat_epsilon': self.split_rhat('epsilon', start, n),
+                       'rhat_delta': self.split_rhat('delta', start, n),
+                       'category_change': change}
+        self.trajectory.append(diagnostics)
+
+        ## nan (not enough samples, or a variable that has not moved) never meets a threshold
+        return (n >= self.min_iterations
+                and diagnostics['ess_epsilon'] >= self.min_ess and diagnostics['ess_delta'] >= self.min_ess
+                and diagnostics['rhat_epsilon'] <= self.max_rhat and diagnostics['rhat_delta'] <= self.max_rhat
+                and change <= self.max_category_change)
+
+## runs joint_inference once for each dictionary of keyword arguments in settings and reports,
+## for each, the run time and the effective samples per second of epsilon and delta after burn_in
+def compare_mh_kernels(data, iterations, burn_in, settings, seed=0):
+    from joint_inference import joint_inference
+
+    report = []
+    for setting in settings:
+        random.seed(seed)
+        start = time.time()
+        verb_categories, epsilon, delta = joint_inference(data, iterations, verbose=False, **setting)
+        seconds = time.time() - start
+
+        result = dict(setting)
+        result['seconds'] = seconds
+        for name, samples in (('epsilon', epsilon[burn_in:]), ('delta', delta[burn_in:])):
+            ess = effective_sample_size(samples)
+            result['ess_' + name] = ess
+            result['ess_per_second_' + name] = ess/seconds
+        report.append(result)
+
+    return report
+
+## compares the original random-restart MH steps with the persistent kernel, with and without
+## adaptive logit-scale proposals, on the CHILDES data
+if __name__ == '__main__':
+    from joint_inference import data
+    from propose_and_accept import Var, Proposal
+
+    settings = [{'mh_steps': 10, 'persistent_mh': False},
+                {'mh_steps': 3, 'persistent_mh': True},
+                {'mh_steps': 3, 'persistent_mh': True, 'adapt_iterations': 100,
+                 'proposals': {Var.EPSILON: Proposal(logit=True), Var.DELTA: Proposal(logit=True)}}]
+    for result in compare_mh_kernels(data, 300, 100, settings):
+        if 'proposals' in result:
+            result['acceptance_rates'] = {var.name: proposal.acceptance_rate() for var, proposal in result.pop('proposals').items()}
+        print(result)
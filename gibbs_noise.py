@@ -0,0 +1,74 @@
+#Samples epsilon and delta by data augmentation, as an alternative to the Metropolis-Hastings steps in MH.py.
+#For each verb, the latent number of signal observations n1 and signal direct objects k1 are drawn from
+#   their joint posterior given the verb's category T, epsilon and delta (the terms of the double sum in
+#   Equation (8) in Perkins, Feldman & Lidz, normalised). Given these counts, the Beta(1,1) priors are
+#   conjugate:
+#   epsilon ~ Beta(1 + total noise observations n0, 1 + total signal observations n1)
+#   delta ~ Beta(1 + total noise direct objects k0, 1 + total noise observations without objects n0 - k0)
+#   so each Gibbs step costs one draw of (n1, k1) per verb and two Beta draws, instead of a full
+#   likelihood evaluation over every verb for each Metropolis-Hastings proposal.
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#verb_categories: a list of category values (1, 2, or 3) for each verb in the data
+#   1: verb is fully transitive (theta = 1)
+#   2: verb is fully intransitive (theta = 0)
+#   3: verb is mixed (theta integrated out under its Beta(1,1) prior, as in likelihoods.py)
+#Delta: a value from 0 to 1
+#Epsilon: a value from 0 to 1
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py)
+#rng: a NumPy random Generator
+#Returns a new value of epsilon and a new value of delta
+
+import numpy as np
+from vectorized_likelihoods import log_term_grids, logsumexp
+
+## draws (n1, k1) for one verb from p(n1, k1|k, n, T, epsilon, delta)
+def sample_latent_counts(verb, category, delta, epsilon, gammas, rng):
+
+    k = verb[0]
+    n = verb[1]
+
+    k0term, noise = log_term_grids(verb, delta, epsilon, gammas.logfactorials)
+
+    ## log weight of each possible (n1, k1) pair under the verb's category
+    if category == 1:
+        ## transitive: k1 = n1
+        n1 = np.arange(min(n, k)+1)
+        k1 = n1
+        weights = k0term[n1, k1] + noise[n1]
+    elif category == 2:
+        ## intransitive: k1 = 0
+        n1 = np.arange(n+1)
+        k1 = np.zeros(n+1, dtype=int)
+        weights = k0term[:, 0] + noise
+    else:
+        ## alternating: p(k1|n1) = 1/(n1+1) for every k1 <= n1
+        n1, k1 = np.indices(k0term.shape)
+        weights = np.where(k1 <= n1, k0term - np.log(n1+1) + noise[:, None], float('-inf'))
+        n1 = n1.ravel()
+        k1 = k1.ravel()
+        weights = weights.ravel()
+
+    probabilities = np.exp(weights - logsumexp(weights))
+    cell = rng.choice(len(probabilities), p=probabilities/probabilities.sum())
+
+    return int(n1[cell]), int(k1[cell])
+
+def sample_epsilon_delta(data, verb_categories, delta, epsilon, gammas, rng):
+
+    signal = 0
+    noise = 0
+    noise_objects = 0
+
+    for verb, category in zip(data, verb_categories):
+        n1, k1 = sample_latent_counts(verb, category, delta, epsilon, gammas, rng)
+        signal += n1
+        noise += verb[1] - n1
+        noise_objects += verb[0] - k1
+
+    ## conjugate Beta(1,1) updates
+    newepsilon = rng.beta(1 + noise, 1 + signal)
+    newdelta = rng.beta(1 + noise_objects, 1 + noise - noise_objects)
+
+    return float(newepsilon), float(newdelta)
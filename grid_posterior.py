@@ -0,0 +1,204 @@
+#Computes the posterior on epsilon and delta on a grid, instead of sampling it with joint_inference.py.
+#Given epsilon and delta the verbs are independent, and summing each verb's likelihood over the three
+#   categories (weighted by the prior P(T) of Equation (7)) leaves the marginal posterior
+#       p(epsilon, delta|data) proportional to the product over verbs of sum_T P(T) p(k|T, epsilon, delta)
+#   (the priors on epsilon and delta are Beta(1,1), so flat). This is a function of two variables only,
+#   so it can be evaluated exactly on a grid, with no MH steps and no Gibbs loop:
+#   - the log posterior is computed at the midpoints of a size x size grid of cells. In 'collapsed'
+#     mode (see collapsed_likelihoods.py) all grid points and verbs of a block of grid rows are
+#     computed in one broadcast call, and verbs with identical counts are computed once
+#   - blocks of grid rows are spread over a pool of worker processes
+#   - the marginals, means and standard deviations of epsilon and delta, and each verb's posterior
+#     probabilities of the three categories, are sums over the grid cells (midpoint quadrature)
+#   - with refinements, the grid is then shrunk to the smallest box (plus one cell on each side) that
+#     holds all but tail of the posterior mass, and evaluated again at the same size, so the cells
+#     get smaller where the mass is. The work is a fixed number of grid evaluations, so the time
+#     taken is known in advance, and the answers have no Monte Carlo noise.
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#size: number of grid cells along epsilon and along delta
+#refinements: number of times the grid is shrunk around the posterior mass and evaluated again
+#tail: posterior mass that may be left outside the refined grid
+#log_prior: optional 3-element list of log prior probabilities of the categories (flat by default)
+#mode: likelihood engine (see likelihoods.py for the options). 'collapsed' is vectorized over the
+#   whole grid; the other engines are called once per verb and grid point
+#processes: number of worker processes (by default, one per CPU; 1 computes the grid in this process)
+#Returns a dictionary with:
+#   epsilons, deltas: grid midpoints of the final grid
+#   log_posterior: unnormalized log posterior at every (epsilon, delta) grid point
+#   epsilon_marginal, delta_marginal: posterior densities at the grid midpoints
+#   epsilon_mean, epsilon_sd, delta_mean, delta_sd, map (the grid point with the highest posterior)
+#   category_posteriors: (verbs x 3) posterior probabilities of T1, T2, T3 for each verb in data
+#   log_evidence: log p(data), integrated over the grid, divided by 1 - dropped to add back the mass
+#       outside it
+#   ranges: the (epsilon, delta) ranges of each grid evaluated
+#   dropped: posterior mass outside the final grid, as estimated from the coarser grids
+
+import os
+import math
+import multiprocessing
+import numpy as np
+from collapsed_likelihoods import collapsed_log_likelihoods
+from vectorized_likelihoods import logsumexp
+
+## largest number of (grid point, verb, category) values computed in one broadcast call
+BLOCK = 2000000
+
+## settings of the worker process, set once by attach_worker
+grid_worker = {}
+
+def attach_worker(counts, multiplicity, deltas, log_prior, mode):
+    grid_worker['counts'] = counts
+    grid_worker['multiplicity'] = multiplicity
+    grid_worker['deltas'] = deltas
+    grid_worker['log_prior'] = log_prior
+    grid_worker['mode'] = mode
+    if mode != 'collapsed':
+        from log_choose import build_gammas
+        grid_worker['gammas'] = build_gammas(counts.tolist())
+
+## midpoints of size equal cells between low and high, and the width of a cell
+def grid_points(low, high, size):
+    edges = np.linspace(low, high, size+1)
+    return (edges[:-1] + edges[1:])/2, (high - low)/size
+
+## (epsilons x deltas x verbs x 3) log likelihoods of the verbs over the three categories
+def grid_likelihoods(epsilons, deltas, counts, mode):
+    if mode == 'collapsed':
+        return collapsed_log_likelihoods(counts[:, 0], counts[:, 1], deltas[None, :, None], epsilons[:, None, None])
+
+    from likelihoods import likelihoods
+    values = np.empty((len(epsilons), len(deltas), len(counts), 3))
+    for i, epsilon in enumerate(epsilons):
+        for j, delta in enumerate(deltas):
+            for verbNumber, verb in enumerate(counts.tolist()):
+                values[i, j, verbNumber] = likelihoods(verb, float(delta), float(epsilon), grid_worker['gammas'],
+                                                       {}, {}, {}, mode)
+    return values
+
+## log posterior of a block of grid rows, and the verbs' category posteriors summed over the block,
+## weighted by exp(log posterior - the block's largest log posterior)
+def grid_rows(epsilons):
+    counts = grid_worker['counts']
+    deltas = grid_worker['deltas']
+    log_prior = grid_worker['log_prior']
+
+    numerators = grid_likelihoods(epsilons, deltas, counts, grid_worker['mode']) + log_prior
+    verbMarginals = logsumexp(numerators, axis=-1)
+    logPosterior = verbMarginals @ grid_worker['multiplicity']
+
+    largest = float(np.max(logPosterior))
+    weights = np.exp(logPosterior - largest)
+    categoryPosteriors = np.exp(numerators - verbMarginals[..., None])
+    categorySums = np.tensordot(weights, categoryPosteriors, axes=([0, 1], [0, 1]))
+
+    return logPosterior, largest, categorySums
+
+def evaluate_grid(counts, multiplicity, epsilon_range, delta_range, size, log_prior, mode, processes):
+    epsilons, epsilonWidth = grid_points(epsilon_range[0], epsilon_range[1], size)
+    deltas, deltaWidth = grid_points(delta_range[0], delta_range[1], size)
+
+    ## blocks of grid rows small enough to broadcast, and enough of them to keep every process busy
+    rows = max(1, min(BLOCK//(size*len(counts)*3), math.ceil(size/max(processes, 1))))
+    blocks = [epsilons[start:start+rows] for start in range(0, size, rows)]
+
+    initargs = (counts, multiplicity, deltas, log_prior, mode)
+    if processes == 1:
+        attach_worker(*initargs)
+        results = [grid_rows(block) for block in blocks]
+    else:
+        with multiprocessing.Pool(processes, initializer=attach_worker, initargs=initargs) as pool:
+            results = pool.map(grid_rows, blocks)
+
+    logPosterior = np.concatenate([result[0] for result in results])
+    largest = max(result[1] for result in results)
+    categorySums = sum(math.exp(result[1] - largest)*result[2] for result in results)
+
+    weights = np.exp(logPosterior - largest)
+    total = weights.sum()
+    return {'epsilons': epsilons, 'deltas': deltas, 'log_posterior': logPosterior,
+            'weights': weights/total, 'cell': (epsilonWidth, deltaWidth),
+            'log_evidence': largest + math.log(total) + math.log(epsilonWidth*deltaWidth),
+            'category_posteriors': categorySums/total}
+
+## range of the cells holding all but tail of the mass of a marginal, padded by one cell on each side
+def mass_range(points, width, marginal, tail, bounds):
+    cumulative = np.cumsum(marginal)
+    first = int(np.searchsorted(cumulative, tail/2))
+    last = int(np.searchsorted(cumulative, 1 - tail/2))
+    first = max(first - 1, 0)
+    last = min(last + 1, len(points) - 1)
+    low = max(float(points[first]) - width/2, bounds[0])
+    high = min(float(points[last]) + width/2, bounds[1])
+    dropped = float(marginal[:first].sum() + marginal[last+1:].sum())
+    return (low, high), dropped
+
+def grid_posterior(data, size=64, refinements=2, tail=1e-9, log_prior=None, mode='collapsed', processes=None):
+    counts, inverse, multiplicity = np.unique(np.asarray(data, dtype=np.int64).reshape(len(data), 2), axis=0,
+                                              return_inverse=True, return_counts=True)
+    multiplicity = multiplicity.astype(float)
+    log_prior = np.log(np.full(3, 1/3)) if log_prior is None else np.asarray(log_prior, dtype=float)
+    processes = processes or os.cpu_count()
+
+    epsilon_range = (0.0, 1.0)
+    delta_range = (0.0, 1.0)
+    ranges = []
+    dropped = 0.0
+    for level in range(refinements + 1):
+        ranges.append((epsilon_range, delta_range))
+        grid = evaluate_grid(counts, multiplicity, epsilon_range, delta_range, size, log_prior, mode, processes)
+        if level == refinements:
+            break
+
+        new_epsilon_range, epsilonDropped = mass_range(grid['epsilons'], grid['cell'][0], grid['weights'].sum(axis=1),
+                                                       tail, epsilon_range)
+        new_delta_range, deltaDropped = mass_range(grid['deltas'], grid['cell'][1], grid['weights'].sum(axis=0),
+                                                   tail, delta_range)
+        ## no smaller box holds the mass
+        if new_epsilon_range == epsilon_range and new_delta_range == delta_range:
+            break
+        epsilon_range, delta_range = new_epsilon_range, new_delta_range
+        dropped += (1 - dropped)*(epsilonDropped + deltaDropped)
+
+    weights = grid['weights']
+    epsilons, deltas = grid['epsilons'], grid['deltas']
+    epsilonMarginal = weights.sum(axis=1)
+    deltaMarginal = weights.sum(axis=0)
+    epsilonMean = float(epsilonMarginal @ epsilons)
+    deltaMean = float(deltaMarginal @ deltas)
+    best = np.unravel_index(np.argmax(grid['log_posterior']), weights.shape)
+
+    ## the integral over the final grid leaves out the mass dropped by the refinements, so the evidence
+    ## adds it back (dropped is at most about 2*tail per refinement, so it stays well below 1)
+    return {'epsilons': epsilons, 'deltas': deltas, 'log_posterior': grid['log_posterior'],
+            'epsilon_marginal': epsilonMarginal/grid['cell'][0], 'delta_marginal': deltaMarginal/grid['cell'][1],
+            'epsilon_mean': epsilonMean, 'epsilon_sd': float(np.sqrt(epsilonMarginal @ (epsilons - epsilonMean)**2)),
+            'delta_mean': deltaMean, 'delta_sd': float(np.sqrt(deltaMarginal @ (deltas - deltaMean)**2)),
+            'map': (float(epsilons[best[0]]), float(deltas[best[1]])),
+            'category_posteriors': grid['category_posteriors'][inverse.ravel()],
+            'log_evidence': grid['log_evidence'] - math.log1p(-dropped),
+            'ranges': ranges, 'dropped': dropped}
+
+## grid posterior of a data file (see data_io.py), printed like the output of joint_inference.py
+if __name__ == '__main__':
+    import argparse
+    import time
+    from data_io import load_data
+
+    parser = argparse.ArgumentParser(description='Grid posterior on epsilon and delta, with the categories summed out.')
+    parser.add_argument('data', nargs='?', default='Test_data.xlsx')
+    parser.add_argument('--test', default=None)
+    parser.add_argument('--size', type=int, default=64)
+    parser.add_argument('--refinements', type=int, default=2)
+    parser.add_argument('--mode', default='collapsed')
+    parser.add_argument('--processes', type=int, default=None)
+    arguments = parser.parse_args()
+
+    data = load_data(arguments.data, arguments.test)
+    started = time.time()
+    result = grid_posterior(data, arguments.size, arguments.refinements, mode=arguments.mode, processes=arguments.processes)
+    print('epsilon: %.4f (sd %.4f)  delta: %.4f (sd %.4f)  seconds: %.2f' % (result['epsilon_mean'], result['epsilon_sd'],
+          result['delta_mean'], result['delta_sd'], time.time() - started))
+    for verb, posterior in zip(data, result['category_posteriors']):
+        print(verb, ' '.join('%.3f' % p for p in posterior))
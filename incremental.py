@@ -0,0 +1,96 @@
+#Updates a previous run of joint_inference.py when the corpus grows, instead of starting again from
+#   random epsilon and delta on the whole data vector.
+#After a run, save_run_state stores its final epsilon and delta, its last posterior samples of epsilon
+#   and delta, its proposals, and its likelihood cache (not its categories, which the first step of the
+#   update draws again for every verb). incremental_inference then takes the new counts and:
+#   - matches verbs to the previous data (by name if names are given, otherwise by position, with new
+#     verbs appended at the end), only to report which verbs are new or have changed counts
+#   - starts from the previous epsilon and delta, with persistent MH steps, so the chain starts in the
+#     region of the previous posterior and only a short burn-in is needed. The first step of each
+#     iteration draws every verb's category given epsilon and delta, so unchanged verbs go straight
+#     back to their previous posterior
+#   - reuses the previous likelihood cache. Its entries are keyed by counts, delta and epsilon, so this
+#     only saves the likelihoods of unchanged verbs at the starting epsilon and delta: once the MH steps
+#     move epsilon or delta, every verb's likelihoods depend on the new values and are computed again,
+#     whether its counts changed or not. The cost of an update is set by iterations, not by the number
+#     of changed verbs, and it is cheaper than a full run only because the chain is short
+#   - reuses the previous proposals, or proposals with widths set from the spread of the previous
+#     posterior samples, so no adaptation is needed
+#   and saves the state of the updated run for the next refresh.
+#path: file of the previous run's state (see save_run_state), and of the new state unless output is given
+#new_data: the full updated data vector (unchanged, changed and new verbs)
+#new_names: optional names of the verbs in new_data, to match them with the previous run's names
+#iterations: number of iterations of the update
+#burn_in: number of initial iterations not used as samples in the saved state
+#settings: any other keyword arguments of joint_inference (mode, mh_steps, noise_sampler, ...)
+#Returns the results of joint_inference on new_data, and the numbers of the new or changed verbs (for
+#   reporting, e.g. which verbs to look at again; they do not limit the computation)
+#To start from a full run, pass it a LikelihoodCache (joint_inference(..., cache=cache)) and then call
+#   save_run_state(path, data, epsilon, delta, names, proposals, cache, mode)
+
+import random
+import numpy as np
+from joint_inference import joint_inference
+from likelihood_cache import LikelihoodCache
+from checkpoint import save_checkpoint, load_checkpoint
+from propose_and_accept import Var, Proposal
+
+## stores what incremental_inference needs from a finished run (samples: number of final samples kept)
+def save_run_state(path, data, epsilon, delta, names=None, proposals=None, cache=None, mode='vectorized',
+                   samples=500):
+    state = {'data': [list(verb) for verb in data], 'names': names,
+             'epsilon': float(epsilon[-1]), 'delta': float(delta[-1]),
+             'epsilon_samples': [float(value) for value in epsilon[-samples:]],
+             'delta_samples': [float(value) for value in delta[-samples:]],
+             'proposals': proposals, 'mode': mode,
+             'cache': None if cache is None else (cache.maxsize, list(cache.entries.items()))}
+    save_checkpoint(path, state)
+
+## numbers of the verbs in new_data that are new or have different counts, and the number of each
+## verb in old_data (None for new verbs)
+def changed_verbs(old_data, new_data, old_names=None, new_names=None):
+    if old_names is not None and new_names is not None:
+        positions = {name: number for number, name in enumerate(old_names)}
+        previous = [positions.get(name) for name in new_names]
+    else:
+        previous = [number if number < len(old_data) else None for number in range(len(new_data))]
+
+    changed = [number for number, old in enumerate(previous)
+               if old is None or list(old_data[old]) != list(new_data[number])]
+    return changed, previous
+
+def incremental_inference(path, new_data, new_names=None, iterations=200, burn_in=50, seed=None, output=None,
+                          **settings):
+    previous = load_checkpoint(path)
+    ## the match of each verb is only used to find the changed ones, no verb state is carried over
+    changed, _ = changed_verbs(previous['data'], new_data, previous['names'], new_names)
+
+    mode = settings.pop('mode', previous['mode'])
+    settings.setdefault('persistent_mh', True)
+    settings.setdefault('mh_steps', 3)
+
+    ## the previous cache is only valid for the same likelihood mode
+    cache = LikelihoodCache(settings.pop('cache_size', 100000))
+    if previous['cache'] is not None and mode == previous['mode']:
+        for key, verbLikelihoods in previous['cache'][1][-cache.maxsize:]:
+            cache.entries[key] = verbLikelihoods
+
+    ## proposal widths from the previous run, or from the spread of its posterior samples
+    proposals = previous['proposals']
+    if not proposals:
+        proposals = {Var.EPSILON: Proposal(sd=max(2.4*float(np.std(previous['epsilon_samples'])), 1e-3)),
+                     Var.DELTA: Proposal(sd=max(2.4*float(np.std(previous['delta_samples'])), 1e-3))}
+
+    if seed is not None:
+        random.seed(seed)
+    state = {'iteration': 0, 'verb_categories': [], 'epsilon': [previous['epsilon']], 'delta': [previous['delta']],
+             'proposals': proposals, 'monitor': settings.pop('monitor', None),
+             'rng': settings.pop('rng', None) or np.random.default_rng(random.getrandbits(64)),
+             'random': random.getstate()}
+
+    verb_categories, epsilon, delta = joint_inference(new_data, iterations, mode=mode, cache=cache, state=state, **settings)
+
+    save_run_state(output or path, new_data, epsilon, delta, new_names, proposals, cache, mode,
+                   max(len(epsilon) - 1 - burn_in, 1))
+
+    return (verb_categories, epsilon, delta), changed
@@ -0,0 +1,192 @@
+#Builds the verb count data of joint_inference.py from annotated corpora, instead of a hand-made list:
+#   each corpus file has one line per verb token, with the verb's lemma and a flag saying whether
+#   that token has a direct object, e.g.
+#       eat<TAB>1
+#       eat<TAB>0
+#   and the counts of each lemma are [k, n], with k the tokens with a direct object and n all tokens.
+#Files are streamed, never read into memory whole:
+#   - plain files are split into byte ranges of chunk_bytes, cut at line boundaries, and each worker
+#     process reads and counts its own range
+#   - compressed files (.gz, .bz2, .xz) cannot be split, so they are read line by line in this process
+#     and handed to the workers in chunks of chunk_lines lines, with at most two chunks per worker
+#     waiting at a time
+#   - each worker returns the counts of its range or chunk, and these are merged as they come in
+#     (map-reduce), so memory holds the counts plus a few chunks
+#paths: corpus files (or one path)
+#output: if given, the count table is written to this file as one "verb, k, n" row per lemma (tab
+#   separated, with a header row, most frequent lemmas first), which data_io.py reads, so it can be
+#   given directly to the command line of joint_inference.py, sweep.py or grid_posterior.py. It is
+#   compressed if the name ends in .gz, .bz2 or .xz
+#processes: number of worker processes (by default, one per CPU; 1 counts in this process)
+#lemma_column, flag_column: columns of the lemma and the direct object flag (the first and last by default)
+#separator: column separator (any whitespace by default)
+#header: if True, the first line of each file is skipped
+#lowercase: if True, lemmas are lowercased before counting
+#min_count: lemmas with fewer tokens than this are left out of the table
+#Flags: 1, true, yes, y, t, do, dobj or obj for a direct object, and 0, false, no, n, f, none or - for none
+#   (in any case). Blank lines and lines starting with # are skipped, and any other flag is an error.
+#Returns the lemmas and their counts, as load_verbs in data_io.py does: (names, data)
+
+import os
+import sys
+import collections
+import multiprocessing
+from data_io import open_text
+
+TRUE_FLAGS = {'1', 'true', 'yes', 'y', 't', 'do', 'dobj', 'obj'}
+FALSE_FLAGS = {'0', 'false', 'no', 'n', 'f', 'none', '-'}
+COMPRESSED = ('.gz', '.bz2', '.xz')
+
+## adds the tokens of lines to counts, a dictionary of lemma to [k, n]
+def count_lines(lines, counts, settings):
+    lemma_column, flag_column, separator, lowercase = settings
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split(separator)
+        try:
+            lemma = fields[lemma_column].strip()
+            flag = fields[flag_column].strip().lower()
+        except IndexError:
+            raise ValueError('Expected a lemma and a direct object flag in line: ' + line)
+        if flag in TRUE_FLAGS:
+            objects = 1
+        elif flag in FALSE_FLAGS:
+            objects = 0
+        else:
+            raise ValueError('Invalid direct object flag in line: ' + line)
+        if lowercase:
+            lemma = lemma.lower()
+
+        verb = counts.get(lemma)
+        if verb is None:
+            counts[lemma] = [objects, 1]
+        else:
+            verb[0] += objects
+            verb[1] += 1
+    return counts
+
+## counts of the lines starting in the byte range [start, end) of a plain file
+def count_range(task):
+    path, start, end, header, settings = task
+    counts = {}
+    with open(path, 'rb') as f:
+        if start > 0:
+            ## a line cut by start belongs to the previous range
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+        elif header:
+            f.readline()
+
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line.decode('utf-8'))
+            if len(lines) == 10000:
+                count_lines(lines, counts, settings)
+                lines = []
+        count_lines(lines, counts, settings)
+    return counts
+
+def count_chunk(task):
+    lines, settings = task
+    return count_lines(lines, {}, settings)
+
+## adds the counts of a range or chunk to the totals
+def merge_counts(totals, counts):
+    for lemma, (objects, tokens) in counts.items():
+        verb = totals.get(lemma)
+        if verb is None:
+            totals[lemma] = [objects, tokens]
+        else:
+            verb[0] += objects
+            verb[1] += tokens
+    return totals
+
+## tasks of every file: byte ranges of plain files, and chunks of lines of compressed files,
+## read lazily as the tasks are handed out
+def corpus_tasks(paths, chunk_lines, chunk_bytes, header, settings):
+    for path in paths:
+        if path.lower().endswith(COMPRESSED):
+            with open_text(path) as f:
+                if header:
+                    f.readline()
+                lines = []
+                for line in f:
+                    lines.append(line)
+                    if len(lines) == chunk_lines:
+                        yield count_chunk, (lines, settings)
+                        lines = []
+                if lines:
+                    yield count_chunk, (lines, settings)
+        else:
+            size = os.path.getsize(path)
+            for start in range(0, max(size, 1), chunk_bytes):
+                yield count_range, (path, start, min(start + chunk_bytes, size), header, settings)
+
+def write_count_table(path, names, data):
+    with open_text(path, 'w') as f:
+        f.write('verb\tk\tn\n')
+        for name, (objects, tokens) in zip(names, data):
+            f.write('%s\t%d\t%d\n' % (name, objects, tokens))
+
+def ingest(paths, output=None, processes=None, lemma_column=0, flag_column=-1, separator=None, header=False,
+           lowercase=False, min_count=1, chunk_lines=1000000, chunk_bytes=64*2**20):
+
+    if isinstance(paths, str):
+        paths = [paths]
+    settings = (lemma_column, flag_column, separator, lowercase)
+    tasks = corpus_tasks(paths, chunk_lines, chunk_bytes, header, settings)
+    totals = {}
+
+    if processes == 1:
+        for function, task in tasks:
+            merge_counts(totals, function(task))
+    else:
+        processes = processes or os.cpu_count()
+        with multiprocessing.Pool(processes) as pool:
+            ## at most two tasks per worker are queued, so the chunks of compressed files are read
+            ## only as fast as they are counted
+            waiting = collections.deque()
+            for function, task in tasks:
+                if len(waiting) >= 2*processes:
+                    merge_counts(totals, waiting.popleft().get())
+                waiting.append(pool.apply_async(function, (task,)))
+            while waiting:
+                merge_counts(totals, waiting.popleft().get())
+
+    ## most frequent lemmas first, then alphabetical
+    verbs = sorted(((lemma, counts) for lemma, counts in totals.items() if counts[1] >= min_count),
+                   key=lambda verb: (-verb[1][1], verb[0]))
+    names = [lemma for lemma, _ in verbs]
+    data = [counts for _, counts in verbs]
+
+    if output is not None:
+        write_count_table(output, names, data)
+
+    return names, data
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Count direct objects and tokens per verb lemma in annotated corpora.')
+    parser.add_argument('paths', nargs='+', help='corpus files, one verb token per line (may be .gz, .bz2 or .xz)')
+    parser.add_argument('-o', '--output', default='counts.tsv', help='count table to write (default counts.tsv)')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--lemma-column', type=int, default=0)
+    parser.add_argument('--flag-column', type=int, default=-1)
+    parser.add_argument('--separator', default=None, help='column separator (any whitespace by default)')
+    parser.add_argument('--header', action='store_true', help='skip the first line of each file')
+    parser.add_argument('--lowercase', action='store_true')
+    parser.add_argument('--min-count', type=int, default=1)
+    parser.add_argument('--chunk-lines', type=int, default=1000000)
+    arguments = parser.parse_args()
+
+    names, data = ingest(arguments.paths, arguments.output, arguments.processes, arguments.lemma_column,
+                         arguments.flag_column, arguments.separator, arguments.header, arguments.lowercase,
+                         arguments.min_count, arguments.chunk_lines)
+    print(len(names), 'verbs,', sum(verb[1] for verb in data), 'tokens written to', arguments.output, file=sys.stderr)
@@ -0,0 +1,104 @@
+#Records where the time of a joint_inference.py run goes, one record per iteration, instead of
+#   printing every iteration's categories (pass it to joint_inference as instrumentation, and
+#   verbose=False to turn the printing off).
+#Each record is a dictionary with:
+#   iteration, seconds: the iteration and its wall time
+#   sample_categories_seconds, epsilon_seconds, delta_seconds: wall time of each step
+#       (noise_seconds instead of the last two with the 'gibbs' noise sampler)
+#   likelihood_calls: number of verb likelihoods computed in this iteration (see likelihoods.py)
+#   cache_hits, cache_misses, cache_hit_rate, cache_entries: LikelihoodCache lookups in this
+#       iteration, and its size (see likelihood_cache.py)
+#   gammas_size, gammas_bytes: entries and memory of the table of log factorials (see log_choose.py)
+#   acceptance_epsilon, acceptance_delta: acceptance rates of the MH proposals so far
+#   epsilon, delta: values at the end of the iteration
+#path: file to append the records to, one JSON object per line
+#callback: function called with each record
+#profile: file to write cProfile statistics of the whole run to (read with pstats)
+#Disabled has the same methods and does nothing; joint_inference uses it when no instrumentation
+#   is given, so the cost of the hooks is a few empty method calls per iteration.
+
+import json
+import time
+import cProfile
+from contextlib import contextmanager, nullcontext
+from likelihoods import counters
+
+class Instrumentation:
+
+    def __init__(self, path=None, callback=None, profile=None):
+        self.path = path
+        self.callback = callback
+        self.profile = profile
+        self.profiler = cProfile.Profile() if profile else None
+        self.file = None
+        self.record = None
+        self.records = 0
+
+    def start(self):
+        if self.path is not None:
+            self.file = open(self.path, 'a')
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def begin(self, iteration, cache):
+        self.record = {'iteration': iteration}
+        self.started = time.perf_counter()
+        self.calls = counters['likelihoods']
+        self.hits = cache.hits
+        self.misses = cache.misses
+
+    ## times the steps inside the with statement as name_seconds
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record[name + '_seconds'] = time.perf_counter() - started
+
+    def end(self, cache, gammas, proposals, epsilon, delta):
+        record = self.record
+        record['seconds'] = time.perf_counter() - self.started
+        record['likelihood_calls'] = counters['likelihoods'] - self.calls
+        record['cache_hits'] = cache.hits - self.hits
+        record['cache_misses'] = cache.misses - self.misses
+        lookups = record['cache_hits'] + record['cache_misses']
+        record['cache_hit_rate'] = record['cache_hits']/lookups if lookups else 0.0
+        record['cache_entries'] = len(cache)
+        record['gammas_size'] = len(gammas.logfactorials)
+        record['gammas_bytes'] = gammas.logfactorials.nbytes
+        for var, proposal in proposals.items():
+            record['acceptance_' + var.name.lower()] = proposal.acceptance_rate()
+        record['epsilon'] = epsilon
+        record['delta'] = delta
+
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+        if self.callback is not None:
+            self.callback(record)
+        self.records += 1
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class Disabled:
+
+    def start(self):
+        pass
+
+    def begin(self, iteration, cache):
+        pass
+
+    def section(self, name):
+        return nullcontext()
+
+    def end(self, cache, gammas, proposals, epsilon, delta):
+        pass
+
+    def stop(self):
+        pass
@@ -1,107 +1,353 @@
-#Simulates a learner encountering a corpus of observations of many verbs (data)
-#Infers category values (aka, verb transitivity classes) for each verb in data:
-    #1: verb is fully transitive (theta = 1)
-    #2: verb is fully intransitive (theta = 0)
-    #3: verb is mixed (theta sampled from Beta(1,1) uniform distribution
-#Infers a single value of epsilon and delta across all verbs in
-    #data, a decimal between 0 and 1
-#At each iteration, runs 10 steps of the Metropolis-Hastings simulation in
-    #MH, and uses the 10th values generated to sample category
-    #values using sample_categories
-#Data: a list of length n where each item is a 2-element list corresponding
-#   to counts of observations for each of n verbs. In each sublist, the first element
-#   contains counts of direct objects and the second contains total number of observations
-#Iterations: number of iterations to run simulation, must be an integer value
-#Returns epsilon, a list of length n of epsilon values, delta, a list of length n of delta values,
-	#and verb_categories, an nxv matrix of model values for each of v verbs, for each of n iterations
-
-import random
-from MH import *
-from sample_categories import sample_categories
-
-
-def joint_inference(data, iterations):
-
-	#Randomly initialize epsilon and delta
-	epsilon = [random.random()]
-	delta = [random.random()]
-	verb_categories = []
-	gammas = {}
-	#gammas is a dictionary to memoize all the combination terms in the likelihoods
-
-	for i in range(0, iterations):
-
-		print('iteration', i)
-
-		#Use current epsilon and delta to infer category values
-		newcategories = sample_categories(data, epsilon[i], delta[i], gammas)
-		print('categories', newcategories)
-		verb_categories.append(newcategories)
-
-		#Run Metropolis-Hastings simulation 10 times to infer new epsilon
-		#from current delta and category values
-		#MH sampling on epsilon
-		timelogepsilon = MH(data, verb_categories[i], delta[i], epsilon[i], gammas, 10, Var.EPSILON)
-		newepsilon = timelogepsilon[9]
-		epsilon.append(newepsilon)
-
-		#Run Metropolis-Hastings simulation 10 times to infer new delta
-		#from new epsilon and category values
-		#MH sampling on delta
-		timelogdelta = MH(data, verb_categories[i], delta[i], newepsilon, gammas, 10, Var.DELTA)
-		newdelta = timelogdelta[9]
-		delta.append(newdelta)
-
-	return verb_categories, epsilon, delta
-
-#Run joint_inference over 1000 iterations and plot probability distribution over
-#categories, epsilon, and delta
-
-import numpy as np
-import matplotlib.pyplot as plt
-
-def plot_joint_inference(data):
-
-	verb_categories, epsilon, delta = joint_inference(data, 1000)
-
-	#Use every 10th value from last 500 iterations as samples
-	categorysamples = verb_categories[501::10]
-	epsilonsamples = epsilon[501::10]
-	np.savetxt('epsilon', epsilonsamples)
-	deltasamples = delta[501::10]
-	np.savetxt('delta', deltasamples)
-
-	#Plot histogram of epsilon samples
-	fig = plt.figure()
-	ax = fig.add_subplot(111)
-	ax.set_title('Distribution over Epsilon')
-	ax.hist(epsilonsamples)
-	fig.savefig('epsilon.png')
-
-	#Plot histogram of delta samples
-	fig = plt.figure()
-	ax = fig.add_subplot(111)
-	ax.set_title('Distribution over Delta')
-	ax.hist(deltasamples)
-	fig.savefig('delta.png')
-
-	#Display table containing counts of category assignments per category for each verb
-	categories_transposed = list(map(list, zip(*categorysamples)))
-	category_table = []
-
-	for i in range(0, len(data)):
-		histcounts = np.histogram(categories_transposed[i], bins = [1, 2, 3, 4])
-		category_table.append(histcounts[0])
-
-	category_table = np.asarray(category_table)
-	np.savetxt('category_table', category_table, fmt='%1i')
-
-	return category_table
-
-#data containing vector of verb counts from CHILDES Treebank
-#first list element for each verb in the vector is counts of overt direct objects,
-#and second list element is total count for that verb.
-#see 'CHILDESTreebank_VerbData' for all 50 verbs in order.
-data = [[308,1568], [777,1318], [11,859], [541,605], [3,605], [155,583], [406,579], [347,550], [350,509], [350,485], [287,477], [13,451], [57,383], [193,375], [221,366], [299,358], [297,356], [274,352], [265,342], [305,337], [299,331], [268,331], [275,312], [4,308], [161,306], [215,299], [21,294], [114,281], [8,275], [198,263], [11,256], [132,255], [11,253], [112,238], [13,228], [49,227], [205,220], [187,214], [8,197], [161,195], [57,192], [140,191], [141,185], [160,185], [153,183], [7,180], [149,169], [141,166], [115,160], [53,151]]
-
-print(plot_joint_inference(data))
+#Simulates a learner encountering a corpus of observations of many verbs (data)
+#Infers category values (aka, verb transitivity classes) for each verb in data:
+    #1: verb is fully transitive (theta = 1)
+    #2: verb is fully intransitive (theta = 0)
+    #3: verb is mixed (theta sampled from Beta(1,1) uniform distribution
+#Infers a single value of epsilon and delta across all verbs in
+    #data, a decimal between 0 and 1
+#At each iteration, runs 10 steps of the Metropolis-Hastings simulation in
+    #MH, and uses the 10th values generated to sample category
+    #values using sample_categories
+#mh_steps: number of steps of each Metropolis-Hastings simulation (10 by default)
+#persistent_mh: if False, each Metropolis-Hastings simulation starts from a random value,
+	#so most of its steps are burn-in. If True, it continues from the current epsilon or delta,
+	#and a few steps are enough (e.g., mh_steps = 3: the current value plus two proposals)
+#proposals: optional dictionary of Proposal objects (see propose_and_accept.py) for Var.EPSILON
+	#and Var.DELTA. Their acceptance rates can be read after the run with acceptance_rate()
+#adapt_iterations: number of initial iterations (burn-in) during which the widths of the
+	#proposals are adapted towards their target acceptance rates
+#noise_sampler: how epsilon and delta are sampled at each iteration:
+	#'mh': Metropolis-Hastings simulations in MH (the default, as in Perkins, Feldman & Lidz)
+	#'gibbs': data augmentation in gibbs_noise.py, drawing latent signal counts for each verb
+	#and then epsilon and delta from their conjugate Beta posteriors
+#rng: NumPy random Generator used by the 'gibbs' noise sampler. If not given, it is seeded
+	#from the random module, so random.seed() makes the whole run reproducible
+#seed: optional seed for the random module, set before the run starts
+#gammas: optional LogChooseTable (see log_choose.py) to share between runs on the same data
+#log_prior: optional 3-element list of log prior probabilities of the categories (flat by default),
+	#passed on to sample_categories
+#vectorized_categories: if True, the categories of all verbs are drawn at once from rng
+	#(see sample_categories.py) instead of with one random.random() per verb
+#processes: if given, the likelihoods of all verbs at each step are computed in parallel by this
+	#many worker processes (see parallel_likelihoods.py)
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#Iterations: number of iterations to run simulation, must be an integer value
+#mode: likelihood engine passed on to likelihoods.py (see that script for the options)
+#trace: optional TraceStore (see trace_store.py). The sample of each kept iteration (its categories, and
+	#the epsilon and delta they were drawn from, as in epsilon[burn_in::thin]) is written to its
+	#memory-mapped files, only the current state is held in memory, and the returned values are
+	#the thinned samples in the trace
+#monitor: optional ConvergenceMonitor (see diagnostics.py). Its diagnostics are updated every iteration,
+	#and the run stops before iterations once they meet its thresholds. The diagnostics of every check
+	#are kept in monitor.trajectory
+#instrumentation: optional Instrumentation (see instrumentation.py) that records the time of each step,
+	#likelihood calls, cache hit rates and acceptance rates of every iteration, and can profile the run
+#verbose: if True (the default), prints the iteration number and sampled categories of every iteration
+#checkpoint: optional Checkpointer (see checkpoint.py) that saves the full state of the run every
+	#few iterations or seconds
+#state: a state saved by a Checkpointer, to continue that run instead of starting a new one
+	#(use checkpoint.resume)
+#cache_size: number of verb likelihoods kept in the LikelihoodCache shared by
+	#sample_categories and MH (see likelihood_cache.py)
+#cache: optional existing LikelihoodCache to use instead of a new one, e.g. shared by several runs
+	#with the same mode (see sweep.py)
+#Returns epsilon, a list of length n of epsilon values, delta, a list of length n of delta values,
+	#and verb_categories, an nxv matrix of model values for each of v verbs, for each of n iterations
+#joint_inference_batch runs K independent chains in lockstep in this process, for machines with one
+	#core: each step of the K chains is one likelihood evaluation over a (K x verbs) batch, and
+	#one masked accept/reject (see sample_categories_batch and MH_batch). The overhead of each step
+	#is shared by the chains, so the cost per chain falls as K grows. 'collapsed' mode (the default)
+	#computes the whole batch in one broadcast call; other modes loop over the chains. The chains
+	#draw from one NumPy Generator (rng, or seeded from seed), and epsilon and delta are sampled
+	#with MH steps. It returns a (n x K x v) array of categories, and (n+1 x K) arrays of epsilon
+	#and delta values
+
+import os
+import random
+import numpy as np
+from MH import *
+from sample_categories import sample_categories, sample_categories_batch
+from log_choose import build_gammas
+from likelihood_cache import LikelihoodCache
+from gibbs_noise import sample_epsilon_delta
+from parallel_likelihoods import VerbLikelihoodPool
+from trace_store import TraceStore
+from instrumentation import Disabled
+
+
+def joint_inference(data, iterations, mode='vectorized', cache_size=100000, mh_steps=10, persistent_mh=False, proposals=None, adapt_iterations=0, noise_sampler='mh', rng=None, seed=None, gammas=None, processes=None, log_prior=None, vectorized_categories=False, trace=None, monitor=None, instrumentation=None, verbose=True, cache=None, checkpoint=None, state=None):
+
+	if state is not None:
+		#Continue from the saved state of the run
+		start = state['iteration']
+		verb_categories = state['verb_categories']
+		epsilon = state['epsilon']
+		delta = state['delta']
+		proposals = state['proposals']
+		monitor = state['monitor']
+		rng = state['rng']
+		random.setstate(state['random'])
+	else:
+		start = 0
+		if seed is not None:
+			random.seed(seed)
+
+		#Randomly initialize epsilon and delta
+		epsilon = [random.random()]
+		delta = [random.random()]
+		verb_categories = []
+	#gammas is a read-only table of all the combination terms in the likelihoods,
+	#built once up to the largest verb count in the data
+	if gammas is None:
+		gammas = build_gammas(data)
+	#cache holds the likelihoods of every verb over all three categories for recently
+	#visited values of epsilon and delta, so they are not recomputed by MH
+	if cache is None:
+		cache = LikelihoodCache(cache_size)
+
+	if proposals is None:
+		proposals = {}
+	if rng is None:
+		rng = np.random.default_rng(random.getrandbits(64))
+
+	if instrumentation is None:
+		instrumentation = Disabled()
+	elif noise_sampler != 'gibbs':
+		#Default proposals draw the same values as the built-in Gaussian with sigma = 0.25,
+		#and also count their acceptances for the instrumentation
+		proposals.setdefault(Var.EPSILON, Proposal())
+		proposals.setdefault(Var.DELTA, Proposal())
+
+	#pool computes the likelihoods of all verbs in parallel worker processes
+	pool = VerbLikelihoodPool(data, gammas, processes, mode) if processes else None
+
+	try:
+		instrumentation.start()
+		for i in range(start, iterations):
+
+			if verbose:
+				print('iteration', i)
+			instrumentation.begin(i, cache)
+
+			for proposal in proposals.values():
+				proposal.adapting = i < adapt_iterations
+
+			#Use current epsilon and delta to infer category values
+			with instrumentation.section('sample_categories'):
+				newcategories = sample_categories(data, epsilon[-1], delta[-1], gammas, mode, cache, pool,
+					log_prior, rng if vectorized_categories else None)
+			if verbose:
+				print('categories', newcategories)
+			verb_categories.append(newcategories)
+
+			if noise_sampler == 'gibbs':
+				#Draw latent signal counts for each verb, then new epsilon and delta
+				#from their conjugate Beta posteriors
+				with instrumentation.section('noise'):
+					newepsilon, newdelta = sample_epsilon_delta(data, newcategories, delta[-1], epsilon[-1], gammas, rng)
+
+			else:
+				#Run Metropolis-Hastings simulation mh_steps times to infer new epsilon
+				#from current delta and category values
+				#MH sampling on epsilon
+				with instrumentation.section('epsilon'):
+					timelogepsilon = MH(data, newcategories, delta[-1], epsilon[-1], gammas, mh_steps, Var.EPSILON, mode, cache,
+						epsilon[-1] if persistent_mh else None, proposals.get(Var.EPSILON), pool)
+				newepsilon = timelogepsilon[-1]
+
+				#Run Metropolis-Hastings simulation mh_steps times to infer new delta
+				#from new epsilon and category values
+				#MH sampling on delta
+				with instrumentation.section('delta'):
+					timelogdelta = MH(data, newcategories, delta[-1], newepsilon, gammas, mh_steps, Var.DELTA, mode, cache,
+						delta[-1] if persistent_mh else None, proposals.get(Var.DELTA), pool)
+				newdelta = timelogdelta[-1]
+
+			epsilon.append(newepsilon)
+			delta.append(newdelta)
+			instrumentation.end(cache, gammas, proposals, newepsilon, newdelta)
+
+			if trace is not None:
+				#Write the sample of this iteration to the trace (its categories and the epsilon and delta
+				#they were drawn from, as in the lists returned without a trace) and keep only the current state
+				trace.append(i, newcategories, epsilon[-2], delta[-2])
+				del verb_categories[:-1], epsilon[:-1], delta[:-1]
+
+			#Update the online diagnostics and check whether the chain has converged
+			converged = monitor is not None and monitor.update(i, newcategories, newepsilon, newdelta)
+
+			if checkpoint is not None and (checkpoint.due(i) or converged):
+				#Save everything needed to continue the run after this iteration
+				if trace is not None:
+					trace.flush()
+				checkpoint.save({'iteration': i + 1, 'iterations': iterations, 'data': data,
+					'verb_categories': verb_categories, 'epsilon': epsilon, 'delta': delta,
+					'proposals': proposals, 'monitor': monitor, 'rng': rng, 'random': random.getstate(),
+					'trace': {'directory': trace.directory, 'count': trace.count} if trace is not None else None,
+					'settings': {'mode': mode, 'cache_size': cache_size, 'mh_steps': mh_steps,
+						'persistent_mh': persistent_mh, 'adapt_iterations': adapt_iterations,
+						'noise_sampler': noise_sampler, 'processes': processes, 'log_prior': log_prior,
+						'vectorized_categories': vectorized_categories, 'verbose': verbose}})
+
+			if converged:
+				break
+
+	finally:
+		instrumentation.stop()
+		if pool is not None:
+			pool.close()
+		if trace is not None:
+			trace.flush()
+
+	if trace is not None:
+		return trace.categories, trace.epsilon, trace.delta
+
+	return verb_categories, epsilon, delta
+
+def joint_inference_batch(data, iterations, chains=4, mode='collapsed', cache_size=100000, mh_steps=10, persistent_mh=False, proposals=None, adapt_iterations=0, rng=None, seed=None, gammas=None, log_prior=None, verbose=True, cache=None):
+
+	if rng is None:
+		rng = np.random.default_rng(seed)
+	if gammas is None and mode != 'collapsed':
+		gammas = build_gammas(data)
+	#the collapsed batch is computed in one call without a cache
+	if cache is None and mode != 'collapsed':
+		cache = LikelihoodCache(cache_size)
+	if proposals is None:
+		proposals = {}
+
+	#Randomly initialize epsilon and delta of every chain
+	epsilon = [rng.random(chains)]
+	delta = [rng.random(chains)]
+	verb_categories = []
+
+	for i in range(iterations):
+
+		if verbose:
+			print('iteration', i)
+
+		for proposal in proposals.values():
+			proposal.adapting = i < adapt_iterations
+
+		#Use current epsilon and delta of each chain to infer its category values
+		newcategories = sample_categories_batch(data, epsilon[-1], delta[-1], gammas, rng, mode, cache, log_prior)
+		verb_categories.append(newcategories)
+
+		#MH sampling on epsilon, then on delta, for all chains at once
+		newepsilon = MH_batch(data, newcategories, delta[-1], epsilon[-1], gammas, mh_steps, Var.EPSILON, rng, mode, cache,
+			epsilon[-1] if persistent_mh else None, proposals.get(Var.EPSILON))[-1]
+		newdelta = MH_batch(data, newcategories, delta[-1], newepsilon, gammas, mh_steps, Var.DELTA, rng, mode, cache,
+			delta[-1] if persistent_mh else None, proposals.get(Var.DELTA))[-1]
+
+		epsilon.append(newepsilon)
+		delta.append(newdelta)
+
+	return np.array(verb_categories).reshape(-1, chains, len(data)), np.array(epsilon), np.array(delta)
+
+#Run joint_inference over 1000 iterations and plot probability distribution over
+#categories, epsilon, and delta
+
+#Counts how many times each verb was sampled in each category
+#categorysamples: list or array of category vectors (one per sample), e.g. the memory-mapped
+	#categories of a TraceStore
+#Returns an array with one row per verb and one column per category (1, 2, 3)
+def category_table(categorysamples, nverbs):
+	categorysamples = np.asarray(categorysamples).reshape(-1, nverbs)
+	return np.stack([(categorysamples == category).sum(axis=0) for category in (1, 2, 3)], axis=1)
+
+#directory: if given, the samples are written to a TraceStore in this folder as the chain runs
+#iterations, burn_in, thin: samples are every thin-th iteration from burn_in on
+#output: folder for the epsilon, delta and category_table files and the plots
+#plots: if False, the histograms are not drawn and matplotlib is never imported
+#settings: any other keyword arguments of joint_inference (seed, mode, verbose, ...). A monitor is
+	#not allowed to stop the run before burn_in, since no samples would be kept: its min_iterations
+	#is raised to burn_in + 1 if it is lower
+def plot_joint_inference(data, directory=None, iterations=1000, burn_in=501, thin=10, output='.', plots=True, **settings):
+
+	os.makedirs(output, exist_ok=True)
+	monitor = settings.get('monitor')
+	if monitor is not None:
+		monitor.min_iterations = max(monitor.min_iterations, burn_in + 1)
+
+	if directory is not None:
+		#Keep every 10th value from last 500 iterations in the trace
+		trace = TraceStore(directory, iterations, len(data), burn_in=burn_in, thin=thin)
+		categorysamples, epsilonsamples, deltasamples = joint_inference(data, iterations, trace=trace, **settings)
+	else:
+		verb_categories, epsilon, delta = joint_inference(data, iterations, **settings)
+
+		#Use every 10th value from last 500 iterations as samples, with the epsilon and delta each
+		#category sample was drawn from (the last values of epsilon and delta have no categories)
+		categorysamples = verb_categories[burn_in::thin]
+		epsilonsamples = epsilon[burn_in:len(verb_categories):thin]
+		deltasamples = delta[burn_in:len(verb_categories):thin]
+	np.savetxt(os.path.join(output, 'epsilon'), epsilonsamples)
+	np.savetxt(os.path.join(output, 'delta'), deltasamples)
+
+	if plots:
+		#matplotlib is only loaded when plots are drawn
+		import matplotlib
+		matplotlib.use('Agg')
+		import matplotlib.pyplot as plt
+
+		#Plot histogram of epsilon samples
+		fig = plt.figure()
+		ax = fig.add_subplot(111)
+		ax.set_title('Distribution over Epsilon')
+		ax.hist(epsilonsamples)
+		fig.savefig(os.path.join(output, 'epsilon.png'))
+
+		#Plot histogram of delta samples
+		fig = plt.figure()
+		ax = fig.add_subplot(111)
+		ax.set_title('Distribution over Delta')
+		ax.hist(deltasamples)
+		fig.savefig(os.path.join(output, 'delta.png'))
+
+	#Display table containing counts of category assignments per category for each verb
+	table = category_table(categorysamples, len(data))
+	np.savetxt(os.path.join(output, 'category_table'), table, fmt='%1i')
+
+	return table
+
+#Command line entry point, e.g.:
+#	python joint_inference.py (the CHILDES data below, as in Perkins, Feldman & Lidz)
+#	python joint_inference.py Test_data.xlsx --test 3 --iterations 200 --burn-in 101 --seed 1 --output test3 --no-plots
+#	python joint_inference.py counts.csv --mode collapsed --noise-sampler gibbs --quiet
+#Data files are read with data_io.py
+def main(argv=None):
+	import argparse
+	from data_io import load_data
+
+	parser = argparse.ArgumentParser(description='Infer verb transitivity categories and noise parameters from verb counts.')
+	parser.add_argument('data', nargs='?', help='.csv, .tsv, .txt or .xlsx file of verb counts (the CHILDES data by default)')
+	parser.add_argument('--test', help='test dataset to read from a file with several, e.g. 3 for "Test 3" in Test_data.xlsx')
+	parser.add_argument('--sheet', help='.xlsx sheet to read')
+	parser.add_argument('--iterations', type=int, default=1000)
+	parser.add_argument('--burn-in', type=int, default=501)
+	parser.add_argument('--thin', type=int, default=10)
+	parser.add_argument('--seed', type=int)
+	parser.add_argument('--output', default='.', help='folder for the output files')
+	parser.add_argument('--trace', action='store_true', help='write the samples to a memory-mapped trace in OUTPUT/trace as the chain runs')
+	parser.add_argument('--mode', default='vectorized', help='likelihood engine (see likelihoods.py)')
+	parser.add_argument('--noise-sampler', default='mh', choices=['mh', 'gibbs'])
+	parser.add_argument('--no-plots', action='store_true', help='do not draw histograms (matplotlib is not loaded)')
+	parser.add_argument('--quiet', action='store_true', help='do not print every iteration')
+	arguments = parser.parse_args(argv)
+
+	verbs = data if arguments.data is None else load_data(arguments.data, arguments.test, arguments.sheet)
+
+	return plot_joint_inference(verbs, os.path.join(arguments.output, 'trace') if arguments.trace else None,
+		arguments.iterations, arguments.burn_in, arguments.thin, arguments.output, not arguments.no_plots,
+		seed=arguments.seed, mode=arguments.mode, noise_sampler=arguments.noise_sampler, verbose=not arguments.quiet)
+
+#data containing vector of verb counts from CHILDES Treebank
+#first list element for each verb in the vector is counts of overt direct objects,
+#and second list element is total count for that verb.
+#see 'CHILDESTreebank_VerbData' for all 50 verbs in order.
+data = [[308,1568], [777,1318], [11,859], [541,605], [3,605], [155,583], [406,579], [347,550], [350,509], [350,485], [287,477], [13,451], [57,383], [193,375], [221,366], [299,358], [297,356], [274,352], [265,342], [305,337], [299,331], [268,331], [275,312], [4,308], [161,306], [215,299], [21,294], [114,281], [8,275], [198,263], [11,256], [132,255], [11,253], [112,238], [13,228], [49,227], [205,220], [187,214], [8,197], [161,195], [57,192], [140,191], [141,185], [160,185], [153,183], [7,180], [149,169], [141,166], [115,160], [53,151]]
+
+if __name__ == '__main__':
+	print(main())
@@ -0,0 +1,296 @@
+#Registry of the engines ("backends") that compute the likelihoods of a verb, selected at runtime by the
+#   mode argument of likelihoods.py, pdf_theta.py, sample_categories.py, MH.py and joint_inference.py.
+#Each backend computes, for one verb:
+#   likelihoods: p(k|T, epsilon, delta) over the three categories, Equation (8) in Perkins, Feldman & Lidz
+#       (a 3-element vector of log likelihoods)
+#   theta_likelihood: p(k|theta, epsilon, delta), the same sum with p(k1|n1) = Binomial(n1, theta), the
+#       height of the posterior on theta used by pdf_theta.py (a log likelihood)
+#Registered backends (mode):
+#   'sum' (also 'reference'): the original Python summation over (n1, k1) tuples below. Both quantities
+#       share one implementation of the double sum (summed_likelihoods), and this is the backend the
+#       others are checked against
+#   'vectorized': NumPy grids in vectorized_likelihoods.py
+#   'collapsed': closed form in collapsed_likelihoods.py
+#   'truncated': window of the (n1, k1) grid in truncated_likelihoods.py ('truncated:1e-9' sets the tail)
+#register_backend adds another engine under a new name, so that it can be selected with mode=name
+#   everywhere, after checking it with equivalence_matrix.
+#Every backend's functions take (verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode) and
+#   (verb, delta, epsilon, theta, gammas, mode), where mode is the full mode string (e.g. 'truncated:1e-9').
+#equivalence_matrix compares every backend with the reference on edge cases (k = 0, k = n, n = 0, epsilon
+#   and delta near 0 and 1, on every pair of EDGE_VALUES), and on CHILDES-sized verbs with epsilon close
+#   to 1 (CHILDES_CASES, a few pairs each, since the reference takes seconds per verb), and reports the largest difference of each backend and quantity. Differences
+#   are in log space, relative to the size of the reference value when that is above 1, and a backend
+#   passes if they are within its tolerance and it gives -inf exactly where the reference does.
+#   Running this script directly prints the matrix and exits with status 1 if any backend fails.
+
+import sys
+import math
+import itertools
+from operator import add
+import numpy as np
+from vectorized_likelihoods import vectorized_likelihoods, vectorized_theta_likelihood
+from collapsed_likelihoods import collapsed_likelihoods, collapsed_theta_likelihood
+from truncated_likelihoods import truncated_likelihoods, truncated_theta_likelihood, mode_tail
+
+## one likelihood engine: the two functions above, and the largest difference from the reference
+## accepted by equivalence_matrix
+class LikelihoodBackend:
+
+    def __init__(self, name, likelihoods, theta_likelihood, tolerance=1e-9):
+        self.name = name
+        self.likelihoods = likelihoods
+        self.theta_likelihood = theta_likelihood
+        self.tolerance = tolerance
+
+backends = {}
+
+def register_backend(name, likelihoods, theta_likelihood, tolerance=1e-9):
+    backends[name] = LikelihoodBackend(name, likelihoods, theta_likelihood, tolerance)
+    return backends[name]
+
+## backend of a mode string; anything after a colon is an option of the backend
+def get_backend(mode):
+    name = str(mode).split(':')[0]
+    if name not in backends:
+        raise ValueError('Invalid likelihood mode: ' + str(mode))
+    return backends[name]
+
+## the double sum of Equation (8), in log space, for each function in calculate_k1s giving
+## log p(k1|n1) for a category or a value of theta. The (n1, k1) tuples and Equation (9) are
+## shared by all of them
+def summed_likelihoods(verb, delta, epsilon, gammas, calculate_k1s):
+
+    k = verb[0]
+    n = verb[1]
+
+    ## likelihood p(k|T, epsilon, delta)
+    ## create tuples containing all combinations of n1 in range (0, n+1) and k1 in range (0, k+1)
+    ## equivalent to "for n1 in range (0, n+1) for k1 in range (0, k+1)"
+    n1 = range(n+1)
+    k1 = range(k+1)
+    combinations = list(itertools.product(n1, k1)) ## returns cartesian product of n1 x k1
+
+    ## implementing Equation (9) in Perkins, Feldman & Lidz: p(k0|n0, delta), in log space
+    def calculate_k0(n1, k1):
+        if (k-k1)<=(n-n1):
+            k0term = gammas[((k-k1), (n-n1))]+(k-k1)*np.log(delta)+((n-n1)-(k-k1))*np.log(1-delta)
+        else:
+            k0term = float('-inf')
+
+        return k0term
+
+    def calculate_T_likelihood(calculate_Tk1):
+
+        Tcomponent = []
+        
+        ## group k1s by n1 values in order to efficiently compute inner sums in Equation (8)
+        for key, group in itertools.groupby(combinations, lambda x: x[0]):
+            ngroup = list(group)
+            
+            ## itertools.starmap() applies given function using all elements from the tuple as arguments
+			## e.g., it applies calculate_k0 to the (n1, k1) tuples in the given list of tuples
+            k0term = list(itertools.starmap(calculate_k0, ngroup))
+            #log p(k1|n1) for the category (or value of theta) being summed
+            Tk1term = list(itertools.starmap(calculate_Tk1, ngroup))
+            
+            ## computing inner sum for this group of k1s
+			## start by multiplying terms in Equations (9) and (10) in log space for all values of k1
+            Tterm = list(map(add, Tk1term, k0term))
+
+            ## trick for computing the log of a summation without stack overflow:
+			## you can subtract the largest log value from all other values without exponentiating it
+			## log(sum of a_i from i=0 to N) = 
+			##		= log(a_0) + log(1 + (sum of (a_i)/(a_0) from i=1 to N))
+			##		= log(a_0) + log(1 + (sum of exp(log(a_i) - log(a_0)) from i=1 to N))
+			## for a_0 > a_1 > ... > a_N
+            
+            ## sort lists from large to small
+            Tterm.sort(reverse=True)
+            
+            ## if largest log probability in list is -inf, result of subtraction for rest of list is also -inf
+            if Tterm[0] == float('-inf'):
+                Ttermsub = Tterm
+            
+            ## otherwise, perform subtraction for rest of list
+            else:
+                Ttermsub = [(i-Tterm[0]) for i in Tterm]
+            
+            ## exponentiate subtraction result
+            Ttermexp = [math.exp(i) for i in Ttermsub]
+            
+			## add to 1, re-log, and add to first log probability in list
+			## np.log1p() calculates log(1 + x) for each element x of input array
+            Tlogsum = Tterm[0] + np.log1p(sum(Ttermexp[1:]))
+            
+            ## inner sum of Equation (8) is now finished! 
+			## calculate noise term: p(n1|epsilon), following Equation (11)
+			## 'key' is the name for the current value of n1 for this group of k1s
+            noise = gammas[(key, n)]+key*math.log(1-epsilon)+(n-key)*math.log(epsilon)
+            
+            ## add noise term to result of inner sum
+            Tcomponent.append(Tlogsum + noise)
+        
+        ## compute outer sum of Equation (8) using the same trick that we used for inner sum
+        Tcomponent.sort(reverse=True)
+
+        if Tcomponent[0] == float('-inf'):
+            Tcomponentsub = Tcomponent
+
+        else:
+            Tcomponentsub = [(i-Tcomponent[0]) for i in Tcomponent]
+
+        Tcomponentexp = [math.exp(i) for i in Tcomponentsub]
+        
+        #return the calculated likekihood value for this verb category
+        return Tcomponent[0] + np.log1p(sum(Tcomponentexp[1:]))
+
+    return [calculate_T_likelihood(calculate_k1) for calculate_k1 in calculate_k1s]
+
+## the original summation over the three categories
+def reference_likelihoods(verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='sum'):
+
+    ## implementing Equation (10) in Perkins, Feldman & Lidz: p(k1|n1, T), in log space, for each verb category
+    ## T1k1 is result for transitives (T=1)
+    def calculate_T1k1(n1, k1):
+        if (n1, k1) in T1dict:
+            T1k1term = T1dict[(n1, k1)]
+
+        else:
+            if k1 <= n1:
+                if k1 == n1:
+                    T1k1term = 0 ## log of 1: transitive category has pr. 1 if k1 = n1
+                else:
+                    T1k1term = float('-inf') ## log of zero: transitive category has pr. 0 for all other k1, n1 combinations
+            else:
+                T1k1term = float('-inf')
+            T1dict[(n1, k1)] = T1k1term
+
+        return T1k1term
+    
+    ## T2k1 is result for intransitives (T=2)
+    def calculate_T2k1(n1, k1):
+        if (n1, k1) in T2dict:
+           T2k1term = T2dict[(n1, k1)]
+
+        else:
+            if k1 <= n1:
+                if k1 == 0:
+                    T2k1term = 0 ## log of 1: intransitive category has pr. 1 if k1 = 0
+                else:
+                    T2k1term = float('-inf') ## log of zero: intransitive category has pr. 0 for all other k1, n1 combinations
+
+            else:
+                T2k1term = float('-inf')
+
+            T2dict[(n1, k1)] = T2k1term
+
+        return T2k1term
+    
+    ## T3k1 is result for alternators (T=3)
+    def calculate_T3k1(n1, k1):
+        if (n1, k1) in T3dict:
+            T3k1term = T3dict[(n1, k1)]
+
+        else:
+            if k1 <= n1:
+                T3k1term = np.log(1.0)-np.log(n1+1) ## result of integrating over all values of theta: 1/(n1+1)
+            else:
+                T3k1term = float('-inf')
+
+            T3dict[(n1, k1)] = T3k1term
+
+        return T3k1term
+    
+    calculate_Tk1 = [calculate_T1k1, calculate_T2k1, calculate_T3k1]
+
+    #final result of Equation (8): calculate likelihood over three categories
+    return summed_likelihoods(verb, delta, epsilon, gammas, calculate_Tk1)
+
+## the original summation with p(k1|n1) = Binomial(n1, theta)
+def reference_theta_likelihood(verb, delta, epsilon, theta, gammas, mode='sum'):
+
+    #implementing the calculation for p(k1 | n1, theta) (Binomial(n, theta)), in log space
+    def calculate_T3k1(n1, k1):
+        if k1 <= n1:
+            T3k1term = gammas[((k1), (n1))] + (k1)*np.log(theta) + ((n1)-(k1))*np.log(1-theta)
+        else:
+            T3k1term = float('-inf')
+
+        return T3k1term
+
+    return summed_likelihoods(verb, delta, epsilon, gammas, [calculate_T3k1])[0]
+
+def vectorized_backend(verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='vectorized'):
+    return vectorized_likelihoods(verb, delta, epsilon, gammas.logfactorials)
+
+def vectorized_theta_backend(verb, delta, epsilon, theta, gammas, mode='vectorized'):
+    return vectorized_theta_likelihood(verb, delta, epsilon, theta, gammas.logfactorials)
+
+def collapsed_backend(verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='collapsed'):
+    return collapsed_likelihoods(verb, delta, epsilon)
+
+def collapsed_theta_backend(verb, delta, epsilon, theta, gammas, mode='collapsed'):
+    return collapsed_theta_likelihood(verb, delta, epsilon, theta)
+
+def truncated_backend(verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='truncated'):
+    return truncated_likelihoods(verb, delta, epsilon, gammas.logfactorials, mode_tail(mode))
+
+def truncated_theta_backend(verb, delta, epsilon, theta, gammas, mode='truncated'):
+    return truncated_theta_likelihood(verb, delta, epsilon, theta, gammas.logfactorials, mode_tail(mode))[0]
+
+register_backend('sum', reference_likelihoods, reference_theta_likelihood, 0.0)
+register_backend('reference', reference_likelihoods, reference_theta_likelihood, 0.0)
+register_backend('vectorized', vectorized_backend, vectorized_theta_backend)
+register_backend('collapsed', collapsed_backend, collapsed_theta_backend)
+register_backend('truncated', truncated_backend, truncated_theta_backend)
+
+## edge cases of the equivalence matrix: no observations, k = 0, k = n, and values near 0 and 1
+EDGE_VERBS = [[0, 0], [0, 1], [1, 1], [0, 25], [25, 25], [1, 25], [24, 25], [12, 25], [19, 20], [2, 40]]
+EDGE_VALUES = [1e-9, 1e-6, 0.01, 0.5, 0.99, 1-1e-6, 1-1e-9]
+EDGE_THETAS = [1e-6, 0.3, 1-1e-6]
+## verbs with hundreds of observations and epsilon close to 1, where the closed form is hardest
+CHILDES_VERBS = [[308, 1568], [777, 1318], [541, 605], [205, 220], [3, 605]]
+CHILDES_VALUES = [(1e-6, 0.9991), (0.2, 0.9995), (0.5, 1-1e-6), (0.01, 1-1e-9)]
+CHILDES_CASES = [(verb, delta, epsilon) for verb in CHILDES_VERBS for delta, epsilon in CHILDES_VALUES]
+
+## difference between a backend's log likelihood and the reference's
+def log_difference(expected, value):
+    if not (np.isfinite(expected) and np.isfinite(value)):
+        return 0.0 if expected == value else float('inf')
+    return abs(value - expected)/max(1.0, abs(expected))
+
+def equivalence_matrix(verbs=EDGE_VERBS, values=EDGE_VALUES, thetas=EDGE_THETAS, names=None, reference='sum',
+                       large_cases=CHILDES_CASES):
+    from log_choose import build_gammas
+
+    gammas = build_gammas(verbs + [verb for verb, _, _ in large_cases])
+    expected = get_backend(reference)
+    if names is None:
+        names = [name for name, backend in backends.items() if backend.likelihoods is not expected.likelihoods]
+
+    cases = [(verb, delta, epsilon) for verb in verbs for delta in values for epsilon in values] + list(large_cases)
+    categoryReference = [expected.likelihoods(verb, delta, epsilon, gammas, {}, {}, {}, reference) for verb, delta, epsilon in cases]
+    thetaReference = [expected.theta_likelihood(verb, delta, epsilon, theta, gammas, reference)
+                      for verb, delta, epsilon in cases for theta in thetas]
+
+    rows = []
+    for name in names:
+        backend = get_backend(name)
+        categoryValues = [backend.likelihoods(verb, delta, epsilon, gammas, {}, {}, {}, name) for verb, delta, epsilon in cases]
+        thetaValues = [backend.theta_likelihood(verb, delta, epsilon, theta, gammas, name)
+                       for verb, delta, epsilon in cases for theta in thetas]
+
+        categoryWorst = max(log_difference(x, y) for before, after in zip(categoryReference, categoryValues)
+                            for x, y in zip(before, after))
+        thetaWorst = max(log_difference(x, y) for x, y in zip(thetaReference, thetaValues))
+        for quantity, worst, count in (('likelihoods', categoryWorst, len(cases)), ('theta_likelihood', thetaWorst, len(thetaValues))):
+            rows.append({'backend': name, 'quantity': quantity, 'cases': count, 'worst': worst,
+                         'tolerance': backend.tolerance, 'passed': worst <= backend.tolerance})
+    return rows
+
+if __name__ == '__main__':
+    rows = equivalence_matrix()
+    for row in rows:
+        print('%-12s %-18s %5d cases  largest difference %.3g (tolerance %.0e)  %s' % (row['backend'], row['quantity'],
+              row['cases'], row['worst'], row['tolerance'], 'ok' if row['passed'] else 'FAILED'))
+    sys.exit(0 if all(row['passed'] for row in rows) else 1)
@@ -0,0 +1,55 @@
+#Least-recently-used cache of p(k|T,epsilon,delta) over the three transitivity categories,
+#   shared by sample_categories.py and the Metropolis-Hastings steps in MH.py.
+#Entries are keyed by (k, n, delta, epsilon) and hold all three category likelihoods, so verbs
+#   with identical counts are computed once, and the likelihoods computed for the category
+#   sample are reused when MH evaluates the current delta and epsilon (and when a proposal
+#   is revisited after it has been accepted).
+#maxsize: largest number of entries kept before the least recently used one is dropped
+#A cache should only be used with one likelihood mode (see likelihoods.py), since the mode is not
+#   part of the key.
+#hits, misses: counts of lookups that were and were not already in the cache
+
+from collections import OrderedDict
+from likelihoods import likelihoods
+
+class LikelihoodCache:
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    ## returns the cached likelihoods of verb, or None if they are not in the cache
+    def lookup(self, verb, delta, epsilon):
+        key = (verb[0], verb[1], delta, epsilon)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def store(self, verb, delta, epsilon, verbLikelihoods):
+        self.entries[(verb[0], verb[1], delta, epsilon)] = verbLikelihoods
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    ## same arguments and result as likelihoods.likelihoods
+    def likelihoods(self, verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='vectorized'):
+        verbLikelihoods = self.lookup(verb, delta, epsilon)
+
+        if verbLikelihoods is None:
+            verbLikelihoods = likelihoods(verb, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode)
+            self.store(verb, delta, epsilon, verbLikelihoods)
+
+        return verbLikelihoods
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.entries)
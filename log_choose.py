@@ -0,0 +1,45 @@
+#Dense table of log binomial coefficients, log(n choose k), shared by all likelihood calculations.
+#Replaces the gammas dictionary that used to be filled lazily with one tuple key per (k, n) pair:
+#   the table stores log(m!) for m in range(0, max_n+1) as one read-only NumPy array, so its memory
+#   footprint is fixed when it is built, every lookup is three array reads, and it pickles as a
+#   single array when handed to worker processes.
+#max_n: largest total count of observations n for any verb in the data
+#logfactorials: optional existing array of log(m!) for m in range(0, max_n+1) to use instead of
+#   building a new one (e.g., an array in shared memory)
+#gammas[(k, n)] returns log(n choose k), following the (k, n) key order of the old dictionary
+#gammas.log_choose(n, k) does the same for NumPy arrays of n and k
+#Both raise a ValueError unless 0 <= k <= n <= max_n, since a negative index into the table would
+#   silently read the wrong log factorial
+
+import math
+import numpy as np
+
+## log(m!) for m in range(0, n+1), from math.lgamma
+def log_factorials(n):
+    return np.array([math.lgamma(m+1) for m in range(n+1)])
+
+class LogChooseTable:
+
+    def __init__(self, max_n, logfactorials=None):
+        self.max_n = max_n
+        if logfactorials is None:
+            logfactorials = log_factorials(max_n)
+        self.logfactorials = logfactorials
+        self.logfactorials.setflags(write=False)
+
+    def __getitem__(self, key):
+        k, n = key
+        if not 0 <= k <= n <= self.max_n:
+            raise ValueError('Invalid log choose key (k, n) = ' + str((k, n)) + ' for a table up to n = ' + str(self.max_n))
+        return self.logfactorials[n] - (self.logfactorials[k] + self.logfactorials[n-k])
+
+    def log_choose(self, n, k):
+        n = np.asarray(n)
+        k = np.asarray(k)
+        if np.any(k < 0) or np.any(k > n) or np.any(n > self.max_n):
+            raise ValueError('Invalid log choose arguments (need 0 <= k <= n <= ' + str(self.max_n) + ')')
+        return self.logfactorials[n] - (self.logfactorials[k] + self.logfactorials[n-k])
+
+## builds a table large enough for every verb in data
+def build_gammas(data):
+    return LogChooseTable(max([verb[1] for verb in data], default=0))
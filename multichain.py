@@ -0,0 +1,94 @@
+#Runs several independent chains of joint_inference in parallel, one per process, and merges their samples.
+#Each chain gets its own seed, spawned from one NumPy SeedSequence, so a run is reproducible from
+#   a single seed and the chains' random streams do not overlap. The data and the table of log
+#   binomial coefficients (see log_choose.py) are built once and handed to every worker process
+#   when it starts, and are only read by the chains.
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#chains: number of independent chains
+#iterations: number of Gibbs sampling iterations per chain
+#burn_in, thin: each chain keeps every thin-th sample after the first burn_in iterations,
+#   as plot_joint_inference does with [501::10]; epsilon and delta are cut at the last
+#   iteration, so that every kept epsilon and delta has a kept category sample
+#seed: seed of the SeedSequence that the chain seeds are spawned from
+#processes: number of worker processes (by default, one per CPU, at most one per chain)
+#lockstep: if True, the chains run in this process instead, advancing together as array operations
+#   (see joint_inference_batch in joint_inference.py), with one Generator seeded from seed
+#settings: any other keyword arguments of joint_inference (mode, mh_steps, noise_sampler, ...). With
+#   lockstep=True only those of joint_inference_batch (LOCKSTEP_SETTINGS) are allowed, and any other
+#   (e.g. noise_sampler, trace, monitor) is an error
+#Returns the merged category_table (counts of sampled categories for each verb, over all chains),
+#   the merged epsilon and delta samples, and the between-chain R-hat of epsilon and delta. A monitor
+#   (see diagnostics.py) may stop each chain at a different iteration: the merged samples keep every
+#   chain's samples, and the R-hat uses the iterations up to the end of the shortest chain
+
+import os
+import multiprocessing
+import numpy as np
+from log_choose import build_gammas
+from diagnostics import potential_scale_reduction
+
+## settings of joint_inference that joint_inference_batch also takes
+LOCKSTEP_SETTINGS = ('mode', 'cache_size', 'mh_steps', 'persistent_mh', 'proposals', 'adapt_iterations', 'log_prior', 'cache')
+
+## data and gammas of the worker process, set once by init_worker
+shared = {}
+
+def init_worker(data, gammas):
+    shared['data'] = data
+    shared['gammas'] = gammas
+
+def run_chain(arguments):
+    from joint_inference import joint_inference
+
+    seed, iterations, settings = arguments
+    ## keep the per-iteration printing of the chains out of the runner's output
+    verb_categories, epsilon, delta = joint_inference(shared['data'], iterations, seed=seed,
+                                                      gammas=shared['gammas'], verbose=False, **settings)
+    return verb_categories, epsilon, delta
+
+def run_chains(data, chains=4, iterations=1000, burn_in=501, thin=10, seed=None, processes=None, lockstep=False, **settings):
+    from joint_inference import category_table, joint_inference_batch
+
+    if lockstep:
+        unsupported = sorted(set(settings) - set(LOCKSTEP_SETTINGS))
+        if unsupported:
+            raise ValueError('Settings not supported with lockstep=True: ' + ', '.join(unsupported))
+
+    gammas = build_gammas(data)
+    if lockstep:
+        verb_categories, epsilon, delta = joint_inference_batch(data, iterations, chains, gammas=gammas,
+                                                                rng=np.random.default_rng(np.random.SeedSequence(seed)),
+                                                                verbose=False, **settings)
+        results = [(list(verb_categories[:, chain]), list(epsilon[:, chain]), list(delta[:, chain])) for chain in range(chains)]
+    else:
+        seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(chains)]
+        if processes is None:
+            processes = min(chains, os.cpu_count() or 1)
+
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(data, gammas)) as pool:
+            results = pool.map(run_chain, [(chain_seed, iterations, settings) for chain_seed in seeds])
+
+    categorysamples = []
+    epsilonsamples = []
+    deltasamples = []
+    for verb_categories, epsilon, delta in results:
+        categorysamples.extend(verb_categories[burn_in::thin])
+        epsilonsamples.extend(epsilon[burn_in:len(verb_categories):thin])
+        deltasamples.extend(delta[burn_in:len(verb_categories):thin])
+
+    ## R-hat from every post-burn-in sample of each chain, up to the last iteration. Chains stopped early
+    ## by a monitor have different lengths, so all are cut to the length of the shortest
+    length = min(len(verb_categories) for verb_categories, _, _ in results)
+    rhat = {'epsilon': potential_scale_reduction([epsilon[burn_in:length] for _, epsilon, _ in results]),
+            'delta': potential_scale_reduction([delta[burn_in:length] for _, _, delta in results])}
+
+    return category_table(categorysamples, len(data)), epsilonsamples, deltasamples, rhat
+
+if __name__ == '__main__':
+    from joint_inference import data
+
+    table, epsilon, delta, rhat = run_chains(data, chains=4, seed=0)
+    print(table)
+    print('R-hat', rhat)
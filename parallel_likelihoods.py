@@ -0,0 +1,102 @@
+#Spreads the likelihood calculations of one iteration over a pool of worker processes, one verb per task.
+#Used by sample_categories.py and pdf_delta_epsilon.py, so that a single chain of joint_inference.py
+#   scales with the number of cores.
+#The verb counts and the table of log factorials (see log_choose.py) are copied once into shared
+#   memory, and every worker reads them from there instead of receiving its own copy.
+#Tasks are handed out most expensive first (by the size (n+1)*(k+1) of each verb's (n1, k1) grid),
+#   so that verbs like [308, 1568] start right away instead of straggling at the end.
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py)
+#processes: number of worker processes (by default, one per CPU)
+#mode: likelihood engine passed on to likelihoods.py (see that script for the options)
+#pool.likelihoods(delta, epsilon, cache) returns the likelihoods of every verb in data over the
+#   three categories, in the order of data. Verbs found in the optional LikelihoodCache (see
+#   likelihood_cache.py) are not recomputed, and verbs with identical counts are computed once.
+#The pool should be closed with close() (or used in a with statement) to free the shared memory.
+
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from likelihoods import likelihoods, counters
+from log_choose import LogChooseTable
+
+## shared arrays of the worker process, attached once by attach_worker
+shared = {}
+
+## copies array into a new block of shared memory
+def share(array):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block
+
+def attach_worker(counts_name, counts_shape, table_name, table_size, mode):
+    shared['blocks'] = [shared_memory.SharedMemory(name=counts_name), shared_memory.SharedMemory(name=table_name)]
+    shared['counts'] = np.ndarray(counts_shape, dtype=np.int64, buffer=shared['blocks'][0].buf)
+    logfactorials = np.ndarray((table_size,), dtype=np.float64, buffer=shared['blocks'][1].buf)
+    shared['gammas'] = LogChooseTable(table_size-1, logfactorials)
+    shared['mode'] = mode
+
+def verb_likelihoods(arguments):
+    verbNumber, delta, epsilon = arguments
+    k, n = shared['counts'][verbNumber]
+    return verbNumber, likelihoods([int(k), int(n)], delta, epsilon, shared['gammas'], {}, {}, {}, shared['mode'])
+
+class VerbLikelihoodPool:
+
+    def __init__(self, data, gammas, processes=None, mode='vectorized'):
+        self.data = data
+        counts = np.asarray(data, dtype=np.int64).reshape(len(data), 2)
+        self.blocks = [share(counts), share(gammas.logfactorials)]
+        self.pool = multiprocessing.Pool(processes or os.cpu_count(), initializer=attach_worker,
+                                         initargs=(self.blocks[0].name, counts.shape, self.blocks[1].name,
+                                                   len(gammas.logfactorials), mode))
+
+        ## largest grids first
+        cost = (counts[:, 0] + 1)*(counts[:, 1] + 1)
+        self.order = [int(i) for i in np.argsort(-cost, kind='stable')]
+
+    def likelihoods(self, delta, epsilon, cache=None):
+        results = [None]*len(self.data)
+
+        ## one task per distinct verb count that is not already cached
+        tasks = []
+        firsts = {}
+        for verbNumber in self.order:
+            verb = self.data[verbNumber]
+            if cache is not None:
+                results[verbNumber] = cache.lookup(verb, delta, epsilon)
+            if results[verbNumber] is None:
+                key = (verb[0], verb[1])
+                if key not in firsts:
+                    firsts[key] = verbNumber
+                    tasks.append((verbNumber, delta, epsilon))
+
+        ## the workers count their own calls; count them here too
+        counters['likelihoods'] += len(tasks)
+        computed = {}
+        for verbNumber, verbLikelihoods in self.pool.imap_unordered(verb_likelihoods, tasks, chunksize=1):
+            computed[verbNumber] = verbLikelihoods
+            if cache is not None:
+                cache.store(self.data[verbNumber], delta, epsilon, verbLikelihoods)
+
+        for verbNumber, verb in enumerate(self.data):
+            if results[verbNumber] is None:
+                results[verbNumber] = computed[firsts[(verb[0], verb[1])]]
+
+        return results
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
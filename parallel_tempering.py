@@ -0,0 +1,162 @@
+#Replica-exchange (parallel tempering) version of joint_inference.py, for data where a single chain
+#   mixes slowly: when epsilon is small, the categories drawn by sample_categories.py and the values of
+#   epsilon and delta drawn by MH.py are strongly coupled, and e.g. an alternating verb with many
+#   observations can stay in T1 for hundreds of iterations.
+#K replicas of the chain run in lockstep (see joint_inference_batch in joint_inference.py), replica r
+#   at inverse temperature betas[r], sampling the tempered posterior
+#       p(k|T, epsilon, delta)^beta P(T) p(epsilon) p(delta)
+#   so in each iteration replica r draws its categories from Equation (7) with its likelihoods raised
+#   to beta (likelihoods times beta in log space), and its MH steps use beta times the log pdf.
+#   Replica 0 has beta = 1 and samples the posterior itself; hotter replicas (smaller beta) see a
+#   flatter posterior and move between modes more easily.
+#After every swap_every iterations, adjacent replicas r and r+1 propose to swap states, with pairs
+#   (0, 1), (2, 3), ... and (1, 2), (3, 4), ... taking turns, and a swap is accepted with probability
+#       min(1, exp((betas[r] - betas[r+1])*(log p(k|state of r+1) - log p(k|state of r))))
+#Data: a list of length n where each item is a 2-element list corresponding
+#   to counts of observations for each of n verbs. In each sublist, the first element
+#   contains counts of direct objects and the second contains total number of observations
+#Iterations: number of iterations to run simulation, must be an integer value
+#betas: inverse temperatures of the replicas, starting with 1. If not given, the ladder has replicas values from
+#   1 down to hottest, evenly spaced in log space (see temperature_ladder)
+#swap_every: number of iterations between rounds of swap moves
+#mode, mh_steps, persistent_mh, proposals, adapt_iterations, log_prior, gammas, cache_size: as in
+#   joint_inference.py ('collapsed' by default, as in joint_inference_batch). Each replica has its own
+#   proposal width, since hotter replicas accept wider steps: the sd of each Proposal becomes an array
+#   with one width per replica, adapted by that replica's acceptances only. Widths stay with their
+#   temperature when states are swapped
+#rng: NumPy random Generator used for every draw (if not given, seeded from seed)
+#Returns the samples of the beta = 1 replica, in the format of joint_inference (verb_categories,
+#   epsilon, delta), and a dictionary with the betas, the number of swaps attempted and accepted and
+#   the swap rate of each adjacent pair, and the run time in seconds
+#compare_to_plain runs the plain sampler (parallel_tempering with the single beta 1, so the same broadcast
+#   likelihoods and MH steps without tempering or swaps) and the tempered one with the same settings, and
+#   reports the effective samples per second of epsilon and delta and the rate of category changes per verb of each
+
+import copy
+import time
+import numpy as np
+from MH import MH_batch
+from propose_and_accept import Var
+from pdf_delta_epsilon import pdf_batch
+from sample_categories import likelihood_batch, draw_categories_batch
+from log_choose import build_gammas
+from likelihood_cache import LikelihoodCache
+from diagnostics import effective_sample_size
+
+## betas from 1 down to hottest, evenly spaced in log space
+def temperature_ladder(replicas, hottest=0.2):
+    return hottest ** (np.arange(replicas)/max(replicas - 1, 1))
+
+## accepted swaps between the adjacent replicas starting at even (parity 0) or odd (parity 1) replicas,
+## given the untempered log likelihood of each replica's state
+def swap_moves(loglikelihoods, betas, parity, rng):
+    pairs = np.arange(parity, len(betas) - 1, 2)
+    with np.errstate(invalid='ignore'):
+        logRatio = (betas[pairs] - betas[pairs+1])*(loglikelihoods[pairs+1] - loglikelihoods[pairs])
+        accepted = np.log(rng.random(len(pairs))) < logRatio
+    return pairs, accepted
+
+def parallel_tempering(data, iterations, betas=None, replicas=6, hottest=0.2, swap_every=1, mode='collapsed',
+                       mh_steps=10, persistent_mh=False, proposals=None, adapt_iterations=0, rng=None, seed=None,
+                       gammas=None, log_prior=None, cache_size=100000, verbose=True):
+
+    betas = temperature_ladder(replicas, hottest) if betas is None else np.asarray(betas, dtype=float)
+    replicas = len(betas)
+
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    if gammas is None and mode != 'collapsed':
+        gammas = build_gammas(data)
+    cache = LikelihoodCache(cache_size) if mode != 'collapsed' else None
+    if proposals is None:
+        proposals = {}
+    for proposal in proposals.values():
+        if np.ndim(proposal.sd) == 0:
+            proposal.sd = np.full(replicas, float(proposal.sd))
+
+    attempted = np.zeros(max(replicas - 1, 0), dtype=np.int64)
+    swapped = np.zeros(max(replicas - 1, 0), dtype=np.int64)
+
+    started = time.time()
+    epsilons = rng.random(replicas)
+    deltas = rng.random(replicas)
+    verb_categories = []
+    epsilon = [float(epsilons[0])]
+    delta = [float(deltas[0])]
+
+    for i in range(iterations):
+
+        if verbose:
+            print('iteration', i)
+
+        for proposal in proposals.values():
+            proposal.adapting = i < adapt_iterations
+
+        ## categories of every replica from its tempered likelihoods
+        loglikelihoods = likelihood_batch(data, epsilons, deltas, gammas, mode, cache)
+        categories = draw_categories_batch(betas[:, None, None]*loglikelihoods, log_prior, rng)
+
+        epsilons = MH_batch(data, categories, deltas, epsilons, gammas, mh_steps, Var.EPSILON, rng, mode, cache,
+                            epsilons if persistent_mh else None, proposals.get(Var.EPSILON), betas)[-1]
+        deltas = MH_batch(data, categories, deltas, epsilons, gammas, mh_steps, Var.DELTA, rng, mode, cache,
+                          deltas if persistent_mh else None, proposals.get(Var.DELTA), betas)[-1]
+
+        if replicas > 1 and (i + 1) % swap_every == 0:
+            pairs, accepted = swap_moves(pdf_batch(data, categories, deltas, epsilons, gammas, mode, cache), betas,
+                                         (i // swap_every) % 2, rng)
+            attempted[pairs] += 1
+            swapped[pairs[accepted]] += 1
+
+            ## exchange the states of the accepted pairs
+            order = np.arange(replicas)
+            order[pairs[accepted]] += 1
+            order[pairs[accepted] + 1] -= 1
+            categories, epsilons, deltas = categories[order], epsilons[order], deltas[order]
+
+        verb_categories.append([int(category) for category in categories[0]])
+        epsilon.append(float(epsilons[0]))
+        delta.append(float(deltas[0]))
+
+    stats = {'betas': betas.tolist(), 'attempted': attempted.tolist(), 'swapped': swapped.tolist(),
+             'swap_rates': (swapped/np.maximum(attempted, 1)).tolist(), 'seconds': time.time() - started}
+    return (verb_categories, epsilon, delta), stats
+
+## mean number of category changes per verb per iteration
+def category_change_rate(verb_categories):
+    categories = np.asarray(verb_categories)
+    if len(categories) < 2:
+        return 0.0
+    return float(np.mean(categories[1:] != categories[:-1]))
+
+## effective samples per second of epsilon and delta, and category change rates, of the plain and the
+## tempered sampler with the same settings, after burn_in iterations. Each run gets its own copy of
+## the settings, so proposals adapted by one run do not carry over to the other
+def compare_to_plain(data, iterations, burn_in, betas=None, replicas=6, hottest=0.2, swap_every=1, seed=0, **settings):
+    report = []
+
+    plain, plainStats = parallel_tempering(data, iterations, [1.0], swap_every=swap_every, seed=seed, verbose=False,
+                                           **copy.deepcopy(settings))
+    tempered, stats = parallel_tempering(data, iterations, betas, replicas, hottest, swap_every, seed=seed,
+                                         verbose=False, **copy.deepcopy(settings))
+    runs = [('plain', plain, plainStats['seconds'], None), ('tempered', tempered, stats['seconds'], stats)]
+
+    for name, (verb_categories, epsilon, delta), seconds, stats in runs:
+        result = {'sampler': name, 'seconds': seconds,
+                  'category_change_rate': category_change_rate(verb_categories[burn_in:])}
+        for variable, samples in (('epsilon', epsilon[burn_in:]), ('delta', delta[burn_in:])):
+            ess = effective_sample_size(samples)
+            result['ess_' + variable] = ess
+            result['ess_per_second_' + variable] = ess/seconds
+        if stats is not None:
+            result['betas'] = stats['betas']
+            result['swap_rates'] = stats['swap_rates']
+        report.append(result)
+
+    return report
+
+## plain and tempered samplers on the CHILDES data
+if __name__ == '__main__':
+    from joint_inference import data
+
+    for result in compare_to_plain(data, 500, 100, mh_steps=3, persistent_mh=True):
+        print(result)
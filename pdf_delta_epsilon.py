@@ -13,40 +13,59 @@
 #   array
 #Delta: a decimal from 0 to 1
 #Epsilon: a decimal from 0 to 1
-#Gammas: Memoization dictionary for likelihoods initialized in joint_inference.py
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py), built in joint_inference.py
 #T1dict, T2dict, T3dict: dictionaries of p(k1|n1, T) for each verb over three verb categories
+#mode: likelihood engine passed on to likelihoods.py (see that script for the options)
+#cache: optional LikelihoodCache (see likelihood_cache.py) shared with sample_categories.py
+#pool: optional VerbLikelihoodPool (see parallel_likelihoods.py) that computes the likelihoods
+#   of all verbs in parallel
 #Returns p, height of function proportional to pdf of posterior probability
 #   on epsilon/delta, at specified value of epsilon/delta
+#pdf_batch computes p for K chains at once (see joint_inference_batch in joint_inference.py), from a
+#   (K x verbs) array of category values and arrays of the K chains' delta and epsilon values,
+#   with one likelihood evaluation for all chains (see likelihood_batch in sample_categories.py)
 
 
+import numpy as np
 from likelihoods import likelihoods
+from sample_categories import likelihood_batch
 
-def likelihood_given_T(verbNumber, data, verb_categories, delta, epsilon, gammas, T1dict, T2dict, T3dict):
+def likelihood_given_T(verbNumber, data, verb_categories, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode='vectorized', cache=None):
 
     #verbNumber: index of each verb
     verbcount = data[verbNumber]
     #given a verb, calculates the likelihoods over three categories
-    verbLikelihoods = likelihoods(verbcount, delta, epsilon, gammas, T1dict, T2dict, T3dict)
+    compute = likelihoods if cache is None else cache.likelihoods
+    verbLikelihoods = compute(verbcount, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode)
 
-    if verb_categories[verbNumber] == 1:
+    return select_category(verbLikelihoods, verb_categories[verbNumber])
+
+#picks the likelihood of the given category out of a verb's likelihoods over three categories
+def select_category(verbLikelihoods, category):
+
+    if category == 1:
         return verbLikelihoods[0]
 
-    elif verb_categories[verbNumber] == 2:
+    elif category == 2:
         return verbLikelihoods[1]
 
-    elif verb_categories[verbNumber] == 3:
+    elif category == 3:
         return verbLikelihoods[2]
 
     else:
         print('Invalid verb category value')
         return float('-inf')
 
-def pdf(data, verb_categories, delta, epsilon, gammas):
+def pdf(data, verb_categories, delta, epsilon, gammas, mode='vectorized', cache=None, pool=None):
 
     if delta < 0 or epsilon < 0:
         p = float('-inf')
     elif delta > 1 or epsilon > 1:
         p = float('-inf')
+    elif pool is not None:
+        ## compute the likelihoods of all verbs in parallel
+        allLikelihoods = pool.likelihoods(delta, epsilon, cache)
+        p = sum([select_category(allLikelihoods[verb], verb_categories[verb]) for verb in range(len(verb_categories))])
     else:
         verbposteriors = []
 
@@ -56,7 +75,7 @@ def pdf(data, verb_categories, delta, epsilon, gammas):
 
         ## loop through every verb in dataset and calculate p(k|T,epsilon,delta)
         ## following likelihood function in Equation (8) in Perkins, Feldman & Lidz
-        verbposteriors = [likelihood_given_T(verb, data, verb_categories, delta, epsilon, gammas, T1dict, T2dict, T3dict) for verb in range(len(verb_categories))]
+        verbposteriors = [likelihood_given_T(verb, data, verb_categories, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode, cache) for verb in range(len(verb_categories))]
 
 ## function f(x) (where X is epsilon or delta) is equal to product across all verbs of likelihood term, times prior on X
 ## prior is equal to 1 for all values of X, because epsilon and delta are both drawn from a Beta(1,1),
@@ -65,3 +84,15 @@ def pdf(data, verb_categories, delta, epsilon, gammas):
         p = sum(verbposteriors)
 
     return p
+
+def pdf_batch(data, verb_categories, deltas, epsilons, gammas, mode='collapsed', cache=None):
+
+    deltas = np.asarray(deltas, dtype=float)
+    epsilons = np.asarray(epsilons, dtype=float)
+    inside = (deltas > 0) & (deltas < 1) & (epsilons > 0) & (epsilons < 1)
+
+    ## chains with values outside (0, 1) are computed at 0.5 and then given zero probability
+    allLikelihoods = likelihood_batch(data, np.where(inside, epsilons, 0.5), np.where(inside, deltas, 0.5), gammas, mode, cache)
+    selected = np.take_along_axis(allLikelihoods, np.asarray(verb_categories)[..., None] - 1, axis=-1)[..., 0]
+
+    return np.where(inside, selected.sum(axis=-1), float('-inf'))
@@ -10,114 +10,41 @@
 #   contains counts of direct objects and the second contains total number of observations
 #Epsilon: a decimal from 0 to 1
 #Delta: a decimal from 0 to 1
-#Gammas: A dictionary to memoize all the combination terms in the likelihoods
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py)
+#mode: likelihood backend that computes the sum (see likelihood_backends.py); 'sum' by default. With
+#   'truncated' (or e.g. 'truncated:1e-9'), only the window of (n1, k1) holding all but a tail of the
+#   mass is summed (see truncated_likelihoods.py)
 #Returns p, height of function proportional to pdf of posterior probability
 #   on theta, at specified value of theta
 #Samples for theta on one verb only
+#pdf_thetas does the same for every verb at once: given theta, the double sum over (n1, k1) reduces to
+#   k ~ Binomial(n, (1-epsilon)*theta + epsilon*delta) (see collapsed_likelihoods.py), so the heights
+#   for all verbs come from one vectorized binomial pmf. Thetas is an array with one value per verb.
 
-import math
 import numpy as np
-import itertools
-from operator import add
+from collapsed_likelihoods import binomial_logpmf
+from likelihood_backends import get_backend
 
 
 
 
-def pdf_theta_one_verb(verbcount, delta, epsilon, theta, gammas):
+def pdf_theta_one_verb(verbcount, delta, epsilon, theta, gammas, mode='sum'):
 	if theta <= 0:
 		T3likelihood = float('-inf')
 	elif theta >= 1:
 		T3likelihood = float('-inf')
 
 	else:
-
-
-		k = verbcount[0]
-		n = verbcount[1]
-
-
-
-		T3component = []
-		## Following code is very similar to code in likelihoods.py. For more extensive explanations of the calculatations, see that script. 
-		## create (n1, k1) tuples containing all combinations of n1 in range (0, n+1) and k1 in range (0, k+1)
-		## equivalent to "for n1 in range (0, n+1) for k1 in range (0, k+1)"
-
-		n1 = range(n+1)
-		k1 = range(k+1)
-		combinations = list(itertools.product(n1, k1))
-		## implementing Equation (9) in Perkins, Feldman & Lidz: p(k0|n0, delta), in log space
-		def calculate_k2(n1, k1):
-			if (k-k1)<=(n-n1):
-				if ((k-k1), (n-n1)) in gammas:
-					k2term = gammas[((k-k1), (n-n1))]+(k-k1)*np.log(delta)+((n-n1)-(k-k1))*np.log(1-delta)
-				else:
-					gammas[((k-k1), (n-n1))] = math.lgamma(n-n1+1)-(math.lgamma(k-k1+1)+math.lgamma((n-n1)-(k-k1)+1))
-					k2term = gammas[((k-k1), (n-n1))]+(k-k1)*np.log(delta)+((n-n1)-(k-k1))*np.log(1-delta)
-
-			else:
-				k2term = float('-inf')
-
-			return k2term
-
-		#implementing the calculation for p(k1 | n1, theta) (Binomial(n, theta)), in log space
-		def calculate_T3k1(n1, k1):
-			if k1 <= n1:
-				if ((k1), (n1)) in gammas:
-					T3k1term = gammas[((k1), (n1))] + (k1)*np.log(theta) + ((n1)-(k1))*np.log(1-theta)
-				else:
-					gammas[((k1), (n1))] = math.lgamma(n1+1)-(math.lgamma(k1+1)+math.lgamma((n1)-(k1)+1))
-					T3k1term = gammas[((k1), (n1))] + (k1)*np.log(theta)+ (((n1)-(k1))*np.log(1-theta))
-			else:
-				T3k1term = float('-inf')
-
-			return T3k1term
-
-		## group k1s by n1 values in order to efficiently compute inner sums in Equation (8)
-		for key, group in itertools.groupby(combinations, lambda x: x[0]):
-			ngroup = list(group)
-			k2term = list(itertools.starmap(calculate_k2, ngroup))
-			T3k1term = list(itertools.starmap(calculate_T3k1, ngroup))
-
-			T3term = list(map(add, T3k1term, k2term))
-
-
-			T3term.sort(reverse=True)
-
-
-
-			if T3term[0] == float('-inf'):
-				T3termsub = T3term
-
-			else:
-				T3termsub = [(i-T3term[0]) for i in T3term]
-
-
-			T3termexp = [math.exp(i) for i in T3termsub]
-
-			T3logsum = T3term[0] + np.log1p(sum(T3termexp[1:]))
-			#Binomial(n, 1-epsilon)
-			if (key, n) in gammas:
-				noise = gammas[(key, n)]+key*math.log(1-epsilon)+(n-key)*math.log(epsilon)
-
-			else:
-				gammas[(key, n)] = math.lgamma(n+1)-(math.lgamma(key+1)+math.lgamma(n-key+1))
-				noise = gammas[(key, n)]+key*math.log(1-epsilon)+(n-key)*math.log(epsilon)
-
-
-			T3component.append(T3logsum + noise)
-
-		T3component.sort(reverse=True)
-
-
-		if T3component[0] == float('-inf'):
-			T3componentsub = T3component
-
-		else:
-			T3componentsub = [(i-T3component[0]) for i in T3component]
-
-		T3componentexp = [math.exp(i) for i in T3componentsub]
-
-		T3likelihood = T3component[0] + np.log1p(sum(T3componentexp[1:]))
+		## the double sum over (n1, k1) with p(k1|n1) = Binomial(n1, theta), from the backend of mode
+		## (by default the original summation, see likelihood_backends.py)
+		T3likelihood = get_backend(mode).theta_likelihood(verbcount, delta, epsilon, theta, gammas, mode)
 	return T3likelihood
 
 
+def pdf_thetas(data, delta, epsilon, thetas):
+	counts = np.asarray(data, dtype=float).reshape(len(data), 2)
+	thetas = np.asarray(thetas, dtype=float)
+	with np.errstate(invalid='ignore'):
+		T3likelihood = binomial_logpmf(counts[:, 0], counts[:, 1], (1-epsilon)*thetas + epsilon*delta,
+			(1-epsilon)*(1-thetas) + epsilon*(1-delta))
+	return np.where((thetas > 0) & (thetas < 1), T3likelihood, float('-inf'))
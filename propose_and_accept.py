@@ -12,16 +12,26 @@
 #   3: verb is mixed (theta sampled from Beta(1,1) uniform distribution)
 #Delta: a value from 0 to 1
 #Epsilon: a value from 0 to 1
-#Gammas: dictionary of combination terms from binomial distribution equations,
-#    passed on to each iteration of Gibbs sampling in joint_inference.py
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py),
+#    built once in joint_inference.py and shared by every iteration of Gibbs sampling
 #Flag: tells which variable we're sampling for. Flag is a class of enums,
 #   either Var.DELTA, Var.EPSILON, or Var.THETA
+#mode: likelihood engine passed on to likelihoods.py, and to pdf_theta_one_verb when sampling theta
+#   (see likelihood_backends.py for the options)
+#cache: optional LikelihoodCache (see likelihood_cache.py) passed on to pdf
+#pool: optional VerbLikelihoodPool (see parallel_likelihoods.py) passed on to pdf
+#proposal: optional Proposal (see below) giving the width and scale of the proposal distribution.
+#   If not given, proposals are drawn from a Gaussian with sigma = 0.25, as in Perkins, Feldman & Lidz.
+#   A Proposal can propose on the logit scale, so that proposals always stay between 0 and 1,
+#   can adapt its width towards a target acceptance rate (during burn-in only), and keeps
+#   count of proposals and acceptances for its variable.
 #Note: When sampling theta, we sample for one verb at at time. So, the 'data' argument will only contain the data for one verb and not the whole vector.
 #Returns a two-element list of the accepted value for delta/epsilon/theta and its acceptance probability
 
 
 import math
 import random
+import numpy as np
 from pdf_delta_epsilon import pdf
 from enum import Enum
 from pdf_theta import pdf_theta_one_verb
@@ -32,45 +42,124 @@ class Var(Enum):
 	EPSILON = 2
 	THETA = 3
 
+## Proposal distribution for one variable (delta, epsilon, or theta)
+## sd: sigma of the Gaussian proposal, on the logit scale if logit is True
+## target: acceptance rate that the width is adapted towards while adapting is True;
+##    0.44 is optimal for a one-dimensional random walk
+class Proposal:
+
+	def __init__(self, sd=0.25, logit=False, target=0.44):
+		self.sd = sd
+		self.logit = logit
+		self.target = target
+		self.adapting = False
+		self.adaptations = 0
+		self.proposed = 0
+		self.accepted = 0
+
+	## returns a proposed value and the log correction to the acceptance probability
+	## proposals on the logit scale need the Jacobian x(1-x) of the transformation
+	def propose(self, var):
+		if not self.logit:
+			return (random.gauss(var, self.sd), 0.0)
+
+		logit_prime = random.gauss(math.log(var) - math.log(1-var), self.sd)
+		var_prime = 1.0/(1.0 + math.exp(-logit_prime))
+		if var_prime <= 0 or var_prime >= 1:
+			#rounded to the boundary, where the pdf is zero
+			return (var_prime, 0.0)
+		return (var_prime, math.log(var_prime) + math.log(1-var_prime) - math.log(var) - math.log(1-var))
+
+	## records the outcome of one proposal, and while adapting, nudges the width in log space
+	## towards the target acceptance rate with a decreasing step size (Robbins-Monro)
+	def update(self, accepted):
+		self.proposed += 1
+		self.accepted += accepted
+		if self.adapting:
+			self.adaptations += 1
+			step = 1.0/(self.adaptations ** 0.6)
+			self.sd = min(max(self.sd*math.exp(step*(accepted - self.target)), 1e-4), 10.0)
+
+	## proposes new values for an array of variables at once (e.g., theta for every verb),
+	## with a NumPy random Generator, and returns them with their log corrections
+	def propose_batch(self, values, rng):
+		if not self.logit:
+			return (values + rng.normal(0.0, self.sd, len(values)), np.zeros(len(values)))
+
+		values_prime = 1.0/(1.0 + np.exp(-(np.log(values) - np.log1p(-values) + rng.normal(0.0, self.sd, len(values)))))
+		with np.errstate(divide='ignore', invalid='ignore'):
+			correction = np.log(values_prime) + np.log1p(-values_prime) - np.log(values) - np.log1p(-values)
+		return (values_prime, np.where(np.isfinite(correction), correction, 0.0))
+
+	## records the outcomes of a batch of proposals; while adapting, a single width moves once,
+	## by the batch's acceptance rate, and an array of widths (one per chain, e.g. per replica in
+	## parallel_tempering.py) moves each width by its own chain's outcome
+	def update_batch(self, accepted):
+		self.proposed += len(accepted)
+		self.accepted += int(np.sum(accepted))
+		if self.adapting:
+			self.adaptations += 1
+			step = 1.0/(self.adaptations ** 0.6)
+			if np.ndim(self.sd):
+				self.sd = np.clip(self.sd*np.exp(step*(np.asarray(accepted, dtype=float) - self.target)), 1e-4, 10.0)
+			else:
+				self.sd = min(max(self.sd*math.exp(step*(np.mean(accepted) - self.target)), 1e-4), 10.0)
+
+	def acceptance_rate(self):
+		return self.accepted/self.proposed if self.proposed else 0.0
+
 ## Acceptance function that takes a current variable, a new proposed variable
 ## and the probabilities of each in the function proportional to the posterior pdf
 ## and decides whether to accept the new proposed variable, or keep the old one
-def accept(var, var_prime, p, p_prime):
+## correction: log ratio of proposal densities, added to the acceptance probability (0 for symmetric proposals)
+## Returns the kept variable, its probability, and whether the proposal was accepted
+def accept(var, var_prime, p, p_prime, correction=0.0):
 	#Reject impossible proposals
 	if p_prime == float('-inf'):
-		return (var, p)
+		return (var, p, False)
 
 	#Accept possible proposal var_prime with acceptance probability A (in log space)
 	else:
-		A = min(0, p_prime-p)
+		A = min(0, p_prime-p+correction)
 
 		if A == 0:
-			return (var_prime, p_prime)
+			return (var_prime, p_prime, True)
 
 		else:
 			x = random.random()
-			if x < math.exp(p_prime-p):
-				return (var_prime, p_prime)
+			if x < math.exp(A):
+				return (var_prime, p_prime, True)
 			else:
-				return (var, p)
+				return (var, p, False)
 			
-def propose_and_accept(data, verb_categories, delta, epsilon, gammas, var, p_var, flag):
+def propose_and_accept(data, verb_categories, delta, epsilon, gammas, var, p_var, flag, mode='vectorized', cache=None, proposal=None, pool=None):
 
 
 	#Sample a new value of var from a proposal distribution Q, a Gaussian
-	#with mu = var and sigma = 0.25
-	var_prime  = random.gauss(var, 0.25)
+	#with mu = var and sigma = 0.25, unless a Proposal is given
+	if proposal is None:
+		var_prime = random.gauss(var, 0.25)
+		correction = 0.0
+	else:
+		var_prime, correction = proposal.propose(var)
 
 	#Call the corresponding pdf function according to the variable flag
-	if flag == Var.DELTA:
+	if var_prime <= 0 or var_prime >= 1:
+		#proposals outside (0, 1) have zero probability, so skip the pdf
+		p_var_prime = float('-inf')
+
+	elif flag == Var.DELTA:
 		#Use pdf to calculate logs of height of var_prime on curve proportional to pdf over var_prime
-		p_var_prime = pdf(data, verb_categories, var_prime, epsilon, gammas)
+		p_var_prime = pdf(data, verb_categories, var_prime, epsilon, gammas, mode, cache, pool)
 
 	elif flag == Var.EPSILON:
-		p_var_prime = pdf(data, verb_categories, delta, var_prime, gammas)
+		p_var_prime = pdf(data, verb_categories, delta, var_prime, gammas, mode, cache, pool)
 
 	else:
 		#If sampling for theta, data argument will only contain the data for one verb. 
-		p_var_prime = pdf_theta_one_verb(data, delta, epsilon, var_prime, gammas)
+		p_var_prime = pdf_theta_one_verb(data, delta, epsilon, var_prime, gammas, mode)
 	#returns both var and p_var to be updated outside this function
-	return accept(var, var_prime, p_var, p_var_prime)
+	value, p, accepted = accept(var, var_prime, p_var, p_var_prime, correction)
+	if proposal is not None:
+		proposal.update(accepted)
+	return (value, p)
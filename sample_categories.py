@@ -6,8 +6,8 @@
 #   contains counts of direct objects and the second contains total number of observations
 #Delta: a decimal from 0 to 1
 #Epsilon: a decimal from 0 to 1
-#Gammas: dictionary of combination terms from binomial distribution equations,
-#    passed on to each iteration of Gibbs sampling in joint_inference.py
+#Gammas: LogChooseTable of log binomial coefficients (see log_choose.py),
+#    built once in joint_inference.py and shared by every iteration of Gibbs sampling
 #transitivity: integers representing verb categories, including transitive (1), intransitive (2), and alternating (3)
 #Infers posterior probabilities on categories for each verb in data:
 #    T1: verb is fully transitive (theta = 1)
@@ -15,36 +15,64 @@
 #    T3: verb is mixed (theta sampled from Beta(1,1) uniform distribution)
 #verbLikelihoods: likelihoods of each verb over three categories
 #T1dict, T2dict, T3dict: dictionaries of p(k1|n1, T) for each verb over three verb categories
+#mode: likelihood engine passed on to likelihoods.py (see that script for the options)
+#cache: optional LikelihoodCache (see likelihood_cache.py) shared with the MH steps
+#pool: optional VerbLikelihoodPool (see parallel_likelihoods.py) that computes the likelihoods
+#   of all verbs in parallel
+#log_prior: optional 3-element list of log prior probabilities of the categories, log P(T) in
+#   Equation (7). If not given, the prior is flat: log(1/3) for each value of T
+#rng: optional NumPy random Generator. If given, the likelihoods of all verbs are collected in one
+#   (verbs x 3) matrix and the categories of all verbs are drawn at once from this Generator,
+#   instead of one random.random() coin flip per verb
 #Samples a category value for each verb by flipping a biased coin weighted by
-#   those posterior probabilities over categories
+#   those posterior probabilities over categories. The posteriors are normalised after subtracting
+#   the largest numerator, so they do not underflow for verbs with many observations
 #Returns a vector of category values (1, 2, or 3) for each verb in the data
 #   matrix, where each element in vector corresponds to a row in the data
 #   matrix
+#sample_categories_batch samples the categories of K chains at once (see joint_inference_batch in
+#   joint_inference.py): epsilons and deltas hold the current values of the K chains, the likelihoods
+#   of all chains and verbs are one (K x verbs x 3) array (a single broadcast call in 'collapsed' mode),
+#   and it returns a (K x verbs) array of category values
 
 
 import math
 import random
 import numpy as np
-from likelihoods import likelihoods
+from likelihoods import likelihoods, counters
+from collapsed_likelihoods import collapsed_log_likelihoods
+from vectorized_likelihoods import logsumexp
 
 #Calculates numerator for Equation (7)
-def proportionate_category_posterior(transitivity, verbLikelihoods):
-    # prior P(T) from Equation (7) is flat: 1/3 for each value of T
-    Tprior = 1.0/3.0
-    numeratorT = verbLikelihoods[transitivity-1] + np.log(Tprior)
+def proportionate_category_posterior(transitivity, verbLikelihoods, log_prior=None):
+    if log_prior is None:
+        # prior P(T) from Equation (7) is flat: 1/3 for each value of T
+        Tprior = 1.0/3.0
+        numeratorT = verbLikelihoods[transitivity-1] + np.log(Tprior)
+    else:
+        numeratorT = verbLikelihoods[transitivity-1] + log_prior[transitivity-1]
     return numeratorT
 
 #Samples a verb category for the verb given
-def calculate_category(verbNumber, data, epsilon, delta, gammas, T1dict, T2dict, T3dict):
+def calculate_category(verbNumber, data, epsilon, delta, gammas, T1dict, T2dict, T3dict, mode='vectorized', cache=None, log_prior=None):
 
     verbcount = data[verbNumber]
 
-    verbLikelihoods = likelihoods(verbcount, delta, epsilon, gammas, T1dict, T2dict, T3dict)
-	
-    numerators = [proportionate_category_posterior(i, verbLikelihoods) for i in range(1,4)]
+    compute = likelihoods if cache is None else cache.likelihoods
+    verbLikelihoods = compute(verbcount, delta, epsilon, gammas, T1dict, T2dict, T3dict, mode)
+
+    return draw_category(verbLikelihoods, log_prior)
+
+#Samples a verb category given the verb's likelihoods over three categories
+def draw_category(verbLikelihoods, log_prior=None):
 
-    numeratorsexp = [math.exp(i) for i in numerators]
-    denominator = np.log(sum(numeratorsexp))
+    numerators = [proportionate_category_posterior(i, verbLikelihoods, log_prior) for i in range(1,4)]
+
+    # subtract the largest numerator before exponentiating, so that verbs with many
+    # observations (very negative log likelihoods) do not underflow to zero
+    largest = max(numerators)
+    numeratorsexp = [math.exp(i - largest) for i in numerators]
+    denominator = largest + np.log(sum(numeratorsexp))
 
     # final result of Equation (7), in log space
     #no need to calculate T3 since the prediction will automatically fall into T3 if it doesn't fit into T1 and T2
@@ -62,9 +90,79 @@ def calculate_category(verbNumber, data, epsilon, delta, gammas, T1dict, T2dict,
         return 3
 
 #Samples verb categories for all verbs
-def sample_categories(data, epsilon, delta, gammas):
+#Collects the likelihoods of all verbs over the three categories in a (verbs x 3) matrix
+def likelihood_matrix(data, epsilon, delta, gammas, mode='vectorized', cache=None, pool=None):
+
+	if pool is not None:
+		return np.array(pool.likelihoods(delta, epsilon, cache))
+
+	## the closed form computes every verb in one vectorized call, which is faster than looking each
+	## verb up in the cache, so a cache is only used by the other modes
+	if mode == 'collapsed':
+		counters['likelihoods'] += len(data)
+		counts = np.asarray(data, dtype=float).reshape(len(data), 2)
+		return collapsed_log_likelihoods(counts[:, 0], counts[:, 1], delta, epsilon)
+
+	compute = likelihoods if cache is None else cache.likelihoods
+	return np.array([compute(verb, delta, epsilon, gammas, {}, {}, {}, mode) for verb in data]).reshape(len(data), 3)
+
+#Samples categories for all verbs at once from a (verbs x 3) matrix of log likelihoods
+def draw_categories(loglikelihoods, log_prior, rng):
+
+	if log_prior is None:
+		log_prior = np.log(np.full(3, 1.0/3.0))
+
+	## Equation (7) for every verb, normalised with log-sum-exp
+	numerators = loglikelihoods + np.asarray(log_prior)
+	posteriors = np.exp(numerators - logsumexp(numerators, axis=1)[:, None])
+
+	## one uniform draw per verb, compared against the cumulative posteriors
+	x = rng.random(len(posteriors))
+	categories = 1 + np.sum(x[:, None] > np.cumsum(posteriors, axis=1)[:, :2], axis=1)
+	return [int(category) for category in categories]
+
+#Collects the likelihoods of all verbs over the three categories for K chains in a (K x verbs x 3) array
+def likelihood_batch(data, epsilons, deltas, gammas, mode='vectorized', cache=None):
+
+	epsilons = np.asarray(epsilons, dtype=float)
+	deltas = np.asarray(deltas, dtype=float)
+
+	## the closed form broadcasts over chains as well as verbs, with or without a cache
+	if mode == 'collapsed':
+		counters['likelihoods'] += len(epsilons)*len(data)
+		counts = np.asarray(data, dtype=float).reshape(len(data), 2)
+		return collapsed_log_likelihoods(counts[:, 0], counts[:, 1], deltas[:, None], epsilons[:, None])
+
+	return np.stack([likelihood_matrix(data, float(epsilon), float(delta), gammas, mode, cache) for epsilon, delta in zip(epsilons, deltas)])
+
+#Samples categories for a batch of chains from a (K x verbs x 3) array of log likelihoods
+def draw_categories_batch(loglikelihoods, log_prior, rng):
+
+	if log_prior is None:
+		log_prior = np.log(np.full(3, 1.0/3.0))
+
+	numerators = loglikelihoods + np.asarray(log_prior)
+	posteriors = np.exp(numerators - logsumexp(numerators, axis=-1)[..., None])
+
+	x = rng.random(posteriors.shape[:-1])
+	return 1 + np.sum(x[..., None] > np.cumsum(posteriors, axis=-1)[..., :2], axis=-1)
+
+def sample_categories_batch(data, epsilons, deltas, gammas, rng, mode='collapsed', cache=None, log_prior=None):
+	return draw_categories_batch(likelihood_batch(data, epsilons, deltas, gammas, mode, cache), log_prior, rng)
+
+def sample_categories(data, epsilon, delta, gammas, mode='vectorized', cache=None, pool=None, log_prior=None, rng=None):
 	verb_categories = []
 
+	## vectorized path: one likelihood matrix and one categorical draw for all verbs
+	if rng is not None:
+		verb_categories = draw_categories(likelihood_matrix(data, epsilon, delta, gammas, mode, cache, pool), log_prior, rng)
+		return verb_categories
+
+	## compute the likelihoods of all verbs in parallel, then sample each category
+	if pool is not None:
+		verb_categories = [draw_category(verbLikelihoods, log_prior) for verbLikelihoods in pool.likelihoods(delta, epsilon, cache)]
+		return verb_categories
+
 	## memoizing specific n1, k1 combinations for Equation (10) in Perkins, Feldman & Lidz
 	## because these will always produce the same result, regardless of the verb identity
 	T1dict = {}
@@ -73,6 +171,6 @@ def sample_categories(data, epsilon, delta, gammas):
 
 	## loop through every verb in dataset and calculate posterior on transitivity categories (T)
 	## following Equation (7) in Perkins, Feldman, & Lidz
-	verb_categories = [calculate_category(verb, data, epsilon, delta, gammas, T1dict, T2dict, T3dict) for verb in range(len(data))]    
+	verb_categories = [calculate_category(verb, data, epsilon, delta, gammas, T1dict, T2dict, T3dict, mode, cache, log_prior) for verb in range(len(data))]    
 
 	return verb_categories
@@ -0,0 +1,148 @@
+#Runs joint_inference.py over a grid of datasets, category priors and sampler settings, for
+#   sensitivity analyses, and writes the results of all runs to one table.
+#The jobs are spread over a pool of worker processes that live for the whole sweep:
+#   - one table of log factorials (see log_choose.py), large enough for every dataset, is built once
+#     and shared with every worker in shared memory, instead of each run building its own
+#   - each worker keeps one LikelihoodCache per likelihood mode across all the jobs it runs. The cache
+#     is keyed by verb counts, delta and epsilon only, so jobs on datasets with overlapping counts, or
+#     on the same dataset with another prior, reuse each other's likelihoods
+#   - jobs are handed out largest first (by iterations times the size of the datasets' (n1, k1) grids)
+#Datasets: dictionary of dataset name to a data list (as in joint_inference.py) or a data file
+#   (see data_io.py)
+#priors: dictionary of prior name to a log_prior for sample_categories (None for the flat prior)
+#settings: dictionary of setting name to a dictionary of other joint_inference arguments
+#   (e.g., {'mode': 'collapsed', 'proposals': {Var.EPSILON: Proposal(sd=0.1), ...}})
+#replicates: number of runs of each combination; replicate r runs with seed seed + r in every cell
+#   of the grid, so cells are compared on common random numbers
+#iterations, burn_in, thin: samples are every thin-th iteration from burn_in on
+#processes: number of worker processes (by default, one per CPU; 1 runs the jobs in this process)
+#output: path of the CSV file with the results, one row per verb of every run, with columns:
+#   dataset, prior, setting, replicate, seed, verb, k, n, p_T1, p_T2, p_T3 (sampled category
+#   frequencies), category (the most frequent), epsilon_mean, epsilon_sd, delta_mean, delta_sd, seconds
+#Returns the rows of the table as a list of dictionaries
+
+import os
+import csv
+import copy
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from log_choose import LogChooseTable, build_gammas
+from likelihood_cache import LikelihoodCache
+from parallel_likelihoods import share
+
+COLUMNS = ['dataset', 'prior', 'setting', 'replicate', 'seed', 'verb', 'k', 'n', 'p_T1', 'p_T2', 'p_T3',
+           'category', 'epsilon_mean', 'epsilon_sd', 'delta_mean', 'delta_sd', 'seconds']
+
+## table of log factorials and likelihood caches of the worker process
+worker = {}
+
+def attach_worker(table_name, table_size, cache_size):
+    worker['block'] = shared_memory.SharedMemory(name=table_name)
+    logfactorials = np.ndarray((table_size,), dtype=np.float64, buffer=worker['block'].buf)
+    worker['gammas'] = LogChooseTable(table_size-1, logfactorials)
+    worker['cache_size'] = cache_size
+    worker['caches'] = {}
+
+def run_job(job):
+    from joint_inference import joint_inference, category_table
+
+    settings = copy.deepcopy(job['settings'])
+    mode = settings.get('mode', 'vectorized')
+    if mode not in worker['caches']:
+        worker['caches'][mode] = LikelihoodCache(worker['cache_size'])
+
+    started = time.time()
+    verb_categories, epsilon, delta = joint_inference(job['data'], job['iterations'], seed=job['seed'],
+                                                      gammas=worker['gammas'], log_prior=job['log_prior'],
+                                                      verbose=False, cache=worker['caches'][mode], **settings)
+    seconds = time.time() - started
+
+    burn_in = job['burn_in']
+    thin = job['thin']
+    table = category_table(verb_categories[burn_in::thin], len(job['data']))
+    ## the last epsilon and delta are drawn after the last iteration and have no category sample
+    epsilonsamples = np.asarray(epsilon[burn_in:len(verb_categories):thin])
+    deltasamples = np.asarray(delta[burn_in:len(verb_categories):thin])
+
+    rows = []
+    for verbNumber, (verb, counts) in enumerate(zip(job['data'], table)):
+        frequencies = counts/max(counts.sum(), 1)
+        rows.append({'dataset': job['dataset'], 'prior': job['prior'], 'setting': job['setting'],
+                     'replicate': job['replicate'], 'seed': job['seed'], 'verb': verbNumber, 'k': verb[0], 'n': verb[1],
+                     'p_T1': frequencies[0], 'p_T2': frequencies[1], 'p_T3': frequencies[2],
+                     'category': int(np.argmax(counts)) + 1,
+                     'epsilon_mean': epsilonsamples.mean(), 'epsilon_sd': epsilonsamples.std(),
+                     'delta_mean': deltasamples.mean(), 'delta_sd': deltasamples.std(), 'seconds': seconds})
+    return rows
+
+def sweep(datasets, priors=None, settings=None, replicates=1, iterations=1000, burn_in=501, thin=10, seed=0,
+          processes=None, output='sweep.csv', cache_size=100000):
+    from data_io import load_data
+
+    datasets = {name: load_data(data) if isinstance(data, str) else data for name, data in datasets.items()}
+    priors = priors or {'flat': None}
+    settings = settings or {'default': {}}
+
+    jobs = []
+    for dataset, data in datasets.items():
+        ## size of the (n1, k1) grids of the dataset, as an estimate of the cost of each of its jobs
+        cost = iterations*sum((verb[0]+1)*(verb[1]+1) for verb in data)
+        for prior, log_prior in priors.items():
+            for setting, arguments in settings.items():
+                for replicate in range(replicates):
+                    jobs.append({'dataset': dataset, 'data': data, 'prior': prior, 'log_prior': log_prior,
+                                 'setting': setting, 'settings': arguments, 'replicate': replicate,
+                                 'seed': seed + replicate, 'iterations': iterations, 'burn_in': burn_in,
+                                 'thin': thin, 'cost': cost})
+    jobs.sort(key=lambda job: -job['cost'])
+
+    ## one table large enough for every dataset, shared by all jobs
+    gammas = build_gammas([verb for data in datasets.values() for verb in data])
+    block = share(gammas.logfactorials)
+    initargs = (block.name, len(gammas.logfactorials), cache_size)
+
+    rows = []
+    try:
+        if processes == 1:
+            attach_worker(*initargs)
+            for job in jobs:
+                rows.extend(run_job(job))
+        else:
+            with multiprocessing.Pool(processes or os.cpu_count(), initializer=attach_worker, initargs=initargs) as pool:
+                for jobrows in pool.imap_unordered(run_job, jobs, chunksize=1):
+                    rows.extend(jobrows)
+    finally:
+        if processes == 1:
+            ## the worker's arrays must be released before its view of the shared table is closed
+            attached = worker.pop('block')
+            worker.clear()
+            attached.close()
+        block.close()
+        block.unlink()
+
+    ## same order of rows whatever order the jobs finished in
+    order = {name: number for number, name in enumerate(datasets)}
+    rows.sort(key=lambda row: (order[row['dataset']], list(priors).index(row['prior']),
+                               list(settings).index(row['setting']), row['replicate'], row['verb']))
+
+    if output is not None:
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    return rows
+
+## sensitivity of the test datasets of Test_data.xlsx to the category prior
+if __name__ == '__main__':
+    import math
+    from data_io import read_tests
+
+    datasets = {test['name']: test['data'] for test in read_tests('Test_data.xlsx')}
+    priors = {'flat': None,
+              'favour_alternating': [math.log(0.25), math.log(0.25), math.log(0.5)]}
+    settings = {'mh': {}, 'gibbs': {'noise_sampler': 'gibbs'}}
+    rows = sweep(datasets, priors, settings, iterations=200, burn_in=101, thin=5)
+    print(len(rows), 'rows written to sweep.csv')
@@ -0,0 +1,46 @@
+#Generates synthetic verb count data from the generative model in Perkins, Feldman & Lidz,
+#   for benchmarks (see benchmark.py) and for checking that the model recovers known parameters.
+#For each verb:
+#   T is drawn from the category probabilities (1: transitive, 2: intransitive, 3: alternating)
+#   theta is 1 for T = 1, 0 for T = 2, and drawn from Beta(1,1) for T = 3
+#   n1 ~ Binomial(n, 1-epsilon) observations are signal and n0 = n - n1 are noise
+#   k1 ~ Binomial(n1, theta) signal observations and k0 ~ Binomial(n0, delta) noise observations
+#   have direct objects, and the verb's counts are [k1 + k0, n]
+#nverbs: number of verbs
+#observations: number of observations n of every verb, or a (low, high) pair to draw each verb's n
+#   log-uniformly between low and high, like the long tail of verb frequencies in CHILDES
+#Epsilon: a value from 0 to 1
+#Delta: a value from 0 to 1
+#category_probabilities: probabilities of the three categories (uniform by default)
+#seed: seed of the NumPy random Generator, so the same arguments always give the same corpus
+#Returns data, a list of [k, n] counts for each verb (the same format as the data vector in
+#   joint_inference.py), and a dictionary with the true categories, thetas, epsilon and delta
+
+import numpy as np
+
+def generate_corpus(nverbs, observations, epsilon=0.2, delta=0.3, category_probabilities=(1/3, 1/3, 1/3), seed=0):
+    rng = np.random.default_rng(seed)
+
+    if isinstance(observations, (tuple, list)):
+        low, high = observations
+        n = np.floor(np.exp(rng.uniform(np.log(low), np.log(high + 1), nverbs))).astype(np.int64)
+        n = np.clip(n, low, high)
+    else:
+        n = np.full(nverbs, observations, dtype=np.int64)
+
+    categories = rng.choice([1, 2, 3], size=nverbs, p=category_probabilities)
+    thetas = np.where(categories == 1, 1.0, np.where(categories == 2, 0.0, rng.uniform(0.0, 1.0, nverbs)))
+
+    signal = rng.binomial(n, 1-epsilon)
+    k = rng.binomial(signal, thetas) + rng.binomial(n - signal, delta)
+
+    data = [[int(verb_k), int(verb_n)] for verb_k, verb_n in zip(k, n)]
+    truth = {'categories': [int(category) for category in categories], 'thetas': thetas.tolist(),
+             'epsilon': epsilon, 'delta': delta}
+
+    return data, truth
+
+if __name__ == '__main__':
+    data, truth = generate_corpus(10, (10, 1000), seed=1)
+    print(data)
+    print(truth['categories'])
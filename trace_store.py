@@ -0,0 +1,126 @@
+#Writes the samples of a joint_inference.py run to memory-mapped .npy files as the chain runs,
+#   instead of keeping every iteration in Python lists and saving them with np.savetxt at the end.
+#The files are preallocated for every kept sample and each sample is written in place, so memory
+#   use does not grow with the length of the run and the samples written so far survive a crash.
+#Directory: folder for the files (created if needed):
+#   categories.npy: int8, one row of category values (1, 2, or 3) per kept sample, one column per verb
+#   epsilon.npy, delta.npy: float64, one value per kept sample
+#   theta.npy: float64, one row of theta values per kept sample (only if thetas=True)
+#   trace.json: number of samples written so far, burn-in and thinning, written when the trace is
+#   created and updated with every kept sample, so a run killed at any point leaves a readable trace
+#Iterations: total number of iterations of the run
+#nverbs: number of verbs in the data
+#burn_in: number of initial iterations that are not kept
+#thin: keep every thin-th iteration after burn-in
+#trace.append(iteration, categories, epsilon, delta) writes the sample of that iteration, if it is kept:
+#   joint_inference passes the categories drawn in it and the epsilon and delta they were drawn from,
+#   so sample j is iteration burn_in + j*thin, as in epsilon[burn_in::thin] of a run without a trace.
+#TraceStore.open(directory) reopens a trace for reading.
+#trace.categories, trace.epsilon, trace.delta (and trace.theta) are the samples written so far
+
+import os
+import json
+import numpy as np
+
+class TraceStore:
+
+    def __init__(self, directory, iterations, nverbs, burn_in=0, thin=1, thetas=False, mode='w+'):
+        self.directory = directory
+        self.burn_in = burn_in
+        self.thin = thin
+        self.size = len(range(burn_in, iterations, thin))
+        self.nverbs = nverbs
+        self.count = 0
+        self.writable = mode != 'r'
+
+        if mode == 'w+':
+            os.makedirs(directory, exist_ok=True)
+        shapes = {'categories': ((self.size, nverbs), np.int8),
+                  'epsilon': ((self.size,), np.float64),
+                  'delta': ((self.size,), np.float64)}
+        if thetas:
+            shapes['theta'] = ((self.size, nverbs), np.float64)
+
+        self.arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            path = os.path.join(directory, name + '.npy')
+            if mode == 'w+':
+                self.arrays[name] = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+            else:
+                self.arrays[name] = np.load(path, mmap_mode=mode)
+        if mode == 'w+':
+            self.write_info()
+
+    ## reopens an existing trace; mode 'r+' allows appending to it
+    @classmethod
+    def open(cls, directory, mode='r'):
+        with open(os.path.join(directory, 'trace.json')) as f:
+            info = json.load(f)
+        trace = cls(directory, info['iterations'], info['nverbs'], info['burn_in'], info['thin'],
+                    os.path.exists(os.path.join(directory, 'theta.npy')), mode)
+        trace.count = info['count']
+        return trace
+
+    ## whether the sample of this iteration is kept
+    def keeps(self, iteration):
+        return iteration >= self.burn_in and (iteration - self.burn_in) % self.thin == 0
+
+    def append(self, iteration, categories, epsilon, delta, theta=None):
+        if not self.keeps(iteration) or self.count >= self.size:
+            return False
+
+        self.arrays['categories'][self.count] = categories
+        self.arrays['epsilon'][self.count] = epsilon
+        self.arrays['delta'][self.count] = delta
+        if theta is not None:
+            self.arrays['theta'][self.count] = theta
+        self.count += 1
+        self.write_info()
+        return True
+
+    ## samples written so far
+    def samples(self, name):
+        return self.arrays[name][:self.count]
+
+    @property
+    def categories(self):
+        return self.samples('categories')
+
+    @property
+    def epsilon(self):
+        return self.samples('epsilon')
+
+    @property
+    def delta(self):
+        return self.samples('delta')
+
+    @property
+    def theta(self):
+        return self.samples('theta')
+
+    ## counts of each category (columns 1, 2, 3) for each verb, read straight from the mapped array
+    def category_table(self):
+        categories = self.categories
+        return np.stack([(categories == category).sum(axis=0) for category in (1, 2, 3)], axis=1)
+
+    ## writes the number of samples written, and the shape of the trace, to trace.json
+    def write_info(self):
+        info = {'count': self.count, 'iterations': self.burn_in + self.size*self.thin,
+                'nverbs': self.nverbs, 'burn_in': self.burn_in, 'thin': self.thin}
+        path = os.path.join(self.directory, 'trace.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(info, f)
+        os.replace(path + '.tmp', path)
+
+    ## writes the mapped arrays and the number of samples written to disk
+    def flush(self):
+        if not self.writable:
+            return
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+        self.write_info()
+
+    def close(self):
+        self.flush()
+        self.arrays = {}
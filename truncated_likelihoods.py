@@ -0,0 +1,215 @@
+#Approximates p(k|T,epsilon,delta) for one verb by summing only the part of the (n1, k1) grid in
+#   Equation (8) in Perkins, Feldman & Lidz that holds all but a small tail of its mass.
+#T1 and T2 only need one k1 per n1, so they are summed exactly over n1 in O(n).
+#T3 (and p(k|theta, epsilon, delta) for pdf_theta_one_verb) needs the full double sum. Here:
+#   - for each n1, k1 is summed over a window around the mode of p(k-k1|n-n1, delta) (times p(k1|n1, theta)
+#     for a given theta), wide enough that Bernstein's inequality leaves at most tail of the binomial
+#     mass outside it
+#   - n1 is scanned coarsely to find the largest row, and the window of rows is grown around it until
+#     the bound on the remaining rows is below tail times the sum so far
+#   so a verb costs roughly O(sqrt(n)*sqrt(k)) terms instead of O(n*k).
+#   Verbs whose whole grid has at most SMALL_GRID cells are summed exactly by vectorized_likelihoods.py,
+#   which is faster at that size.
+#Every term of the sum is positive, so truncation can only underestimate the likelihood. The dropped
+#   mass beyond each window edge is bounded by a geometric series with the ratio of the last two terms.
+#   The bound holds because the terms are log-concave in k1, and (up to the slowly varying 1/(n1+1) factor)
+#   in n1. Each returned bound is on log(true likelihood) - log(approximation), which lies in [0, bound].
+#verb: a 2-element list. The first element contains counts of direct objects
+#   and the second contains total number of observations
+#Delta: a value from 0 to 1
+#Epsilon: a value from 0 to 1
+#logfactorials: optional array of log(m!) for m in range(0, N+1), with N >= n (see log_choose.py)
+#tail: relative tail mass left out of the sum (e.g., 1e-12)
+#In likelihoods.py, mode='truncated' uses DEFAULT_TAIL, and mode='truncated:1e-9' sets the tail
+#Returns a 3-element vector of log likelihoods of the given verb over three verb categories
+
+import math
+import numpy as np
+from log_choose import log_factorials
+from vectorized_likelihoods import vectorized_likelihoods, xlogp, logsumexp
+
+DEFAULT_TAIL = 1e-12
+SMALL_GRID = 50000
+
+## log p(successes|trials, p) for arrays, -inf outside 0 <= successes <= trials
+def binomial_terms(logfactorials, trials, successes, p):
+    possible = (successes >= 0) & (successes <= trials)
+    s = np.where(possible, successes, 0)
+    f = np.where(possible, trials - successes, 0)
+    terms = logfactorials[s + f] - logfactorials[s] - logfactorials[f] + xlogp(s, p) + xlogp(f, 1-p)
+    return np.where(possible, terms, float('-inf'))
+
+## log of the sum of a geometric tail beyond an edge term, given the log of the edge term and of
+## the next term out; -inf if there is no next term, inf if the terms are not decreasing
+def geometric_tail(edge, beyond):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = beyond - edge
+        tail = np.where(ratio < 0, beyond - np.log1p(-np.exp(np.minimum(ratio, 0))), float('inf'))
+    return np.where(beyond == float('-inf'), float('-inf'), tail)
+
+## half-width t with P(|X - mean| >= t) <= tail for a binomial X with the given variance (Bernstein),
+## from solving tail = 2*exp(-t^2/(2*(variance + t/3)))
+def bernstein_width(variance, tail):
+    L = math.log(2/tail)
+    return np.ceil(L/3 + np.sqrt(L*L/9 + 2*L*variance)).astype(int) + 1
+
+## tail value encoded in a likelihood mode such as 'truncated:1e-9'
+def mode_tail(mode):
+    if ':' in mode:
+        return float(mode.split(':', 1)[1])
+    return DEFAULT_TAIL
+
+## log row sums over windows of k1 for the rows n1, and log bounds on what each window leaves out
+## signal(n1, k1) is log p(k1|n1) for the category (or theta); center and half give each row's window
+def row_sums(k, n, n1, delta, signal, center, half, logfactorials):
+    n0 = n - n1
+    lo = np.maximum(0, k - n0)
+    hi = np.minimum(k, n1)
+
+    def cells(rows, k1):
+        return binomial_terms(logfactorials, n0[rows], k - k1, delta) + signal(n1[rows], k1)
+
+    offsets = np.arange(-int(half.max()), int(half.max())+1)
+    k1 = center[:, None] + offsets[None, :]
+    inside = (np.abs(offsets)[None, :] <= half[:, None]) & (k1 >= lo[:, None]) & (k1 <= hi[:, None])
+    rows = np.arange(len(n1))
+    terms = np.where(inside, cells(rows[:, None], np.clip(k1, 0, k)), float('-inf'))
+    sums = logsumexp(terms, axis=1)
+
+    ## geometric bounds on the cells beyond each end of the window that are still possible
+    tails = []
+    for side in (1, -1):
+        edge = center + side*half
+        beyond = edge + side
+        exists = (beyond >= lo) & (beyond <= hi) & (edge >= lo) & (edge <= hi)
+        edgeterm = np.where(exists, cells(rows, np.clip(edge, 0, k)), float('-inf'))
+        beyondterm = np.where(exists, cells(rows, np.clip(beyond, 0, k)), float('-inf'))
+        tails.append(geometric_tail(edgeterm, beyondterm))
+
+    return sums, np.logaddexp(tails[0], tails[1])
+
+## truncated double sum over (n1, k1), returning its log and the log of the bound on what it leaves out
+def truncated_double_sum(k, n, delta, epsilon, signal, window, logfactorials, tail):
+
+    def rows(n1):
+        center, half = window(n1)
+        sums, tails = row_sums(k, n, n1, delta, signal, center, half, logfactorials)
+        noise = binomial_terms(logfactorials, n, n1, 1-epsilon)
+        return noise + sums, noise + tails
+
+    ## coarse scan for the largest row, then a fine scan around it
+    stride = max(1, math.isqrt(n+1)//2)
+    coarse = np.unique(np.append(np.arange(0, n+1, stride), n))
+    g, _ = rows(coarse)
+    if np.max(g) == float('-inf'):
+        return float('-inf'), 0.0
+    best = int(coarse[np.argmax(g)])
+    fine = np.arange(max(0, best - stride), min(n, best + stride) + 1)
+    g, _ = rows(fine)
+    best = int(fine[np.argmax(g)])
+
+    ## grow the window of rows from the largest one on each side, in blocks that double in size
+    kept, kepttails = rows(np.array([best]))
+    kept, kepttails = list(kept), list(kepttails)
+    outer = []
+    for side in (1, -1):
+        edge = best
+        previous = None
+        size = stride
+        while True:
+            if (side == 1 and edge >= n) or (side == -1 and edge <= 0):
+                outer.append(float('-inf'))
+                break
+            block = np.arange(edge + side, min(n, edge + side*size) + 1) if side == 1 \
+                else np.arange(edge + side*size, edge)[::-1]
+            size *= 2
+            block = block[(block >= 0) & (block <= n)]
+            g, gtails = rows(block)
+            kept.extend(g)
+            kepttails.extend(gtails)
+            last = g[-1]
+            before = g[-2] if len(g) > 1 else (previous if previous is not None else kept[0])
+            edge = int(block[-1])
+            previous = last
+            bound = geometric_tail(np.array(before), np.array(last)) + 0.0
+            if (side == 1 and edge >= n) or (side == -1 and edge <= 0):
+                outer.append(float('-inf'))
+                break
+            if float(bound) < float(logsumexp(np.array(kept))) + math.log(tail):
+                outer.append(float(bound))
+                break
+
+    total = float(logsumexp(np.array(kept)))
+    dropped = float(logsumexp(np.array(kepttails + outer)))
+    if total == float('-inf'):
+        return total, 0.0
+    with np.errstate(over='ignore'):
+        return total, float(np.log1p(np.exp(dropped - total)))
+
+def truncated_likelihoods_with_bounds(verb, delta, epsilon, logfactorials=None, tail=DEFAULT_TAIL):
+
+    k = verb[0]
+    n = verb[1]
+
+    if logfactorials is None:
+        logfactorials = log_factorials(n)
+
+    if (n+1)*(k+1) <= SMALL_GRID:
+        return vectorized_likelihoods(verb, delta, epsilon, logfactorials), [0.0, 0.0, 0.0]
+
+    ## T1: k1 = n1, summed exactly over n1
+    n1 = np.arange(min(n, k)+1)
+    noise = binomial_terms(logfactorials, n, n1, 1-epsilon)
+    T1likelihood = float(logsumexp(noise + binomial_terms(logfactorials, n - n1, k - n1, delta)))
+
+    ## T2: k1 = 0, summed exactly over n1
+    n1 = np.arange(n+1)
+    noise = binomial_terms(logfactorials, n, n1, 1-epsilon)
+    T2likelihood = float(logsumexp(noise + binomial_terms(logfactorials, n - n1, k, delta)))
+
+    ## T3: p(k1|n1) = 1/(n1+1); window around the mode of p(k0|n0, delta)
+
+    def signal(n1, k1):
+        return -np.log(n1+1.0)
+
+    def window(n1):
+        n0 = n - n1
+        lo = np.maximum(0, k - n0)
+        hi = np.minimum(k, n1)
+        center = np.clip(k - np.floor((n0+1)*delta).astype(int), lo, np.maximum(lo, hi))
+        half = bernstein_width(n0*delta*(1-delta), tail)
+        return center, half
+
+    T3likelihood, T3bound = truncated_double_sum(k, n, delta, epsilon, signal, window, logfactorials, tail)
+
+    return [T1likelihood, T2likelihood, T3likelihood], [0.0, 0.0, T3bound]
+
+def truncated_likelihoods(verb, delta, epsilon, logfactorials=None, tail=DEFAULT_TAIL):
+    return truncated_likelihoods_with_bounds(verb, delta, epsilon, logfactorials, tail)[0]
+
+## truncated p(k|theta, epsilon, delta) for pdf_theta_one_verb, with its bound
+def truncated_theta_likelihood(verb, delta, epsilon, theta, logfactorials=None, tail=DEFAULT_TAIL):
+
+    k = verb[0]
+    n = verb[1]
+
+    if logfactorials is None:
+        logfactorials = log_factorials(n)
+
+    def signal(n1, k1):
+        return binomial_terms(logfactorials, n1, k1, theta)
+
+    ## k1 is shared between Binomial(n1, theta) and k - Binomial(n0, delta):
+    ## center on the split of k in proportion to the two expected counts
+    def window(n1):
+        n0 = n - n1
+        lo = np.maximum(0, k - n0)
+        hi = np.minimum(k, n1)
+        signalcount = n1*theta
+        noisecount = n0*delta
+        share = np.where(signalcount + noisecount > 0, signalcount/np.maximum(signalcount + noisecount, 1e-300), 0.5)
+        center = np.clip(np.round(k*share).astype(int), lo, np.maximum(lo, hi))
+        half = bernstein_width(n0*delta*(1-delta) + n1*theta*(1-theta), tail)
+        return center, half
+
+    return truncated_double_sum(k, n, delta, epsilon, signal, window, logfactorials, tail)
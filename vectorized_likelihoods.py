@@ -0,0 +1,111 @@
+#Calculates p(k|T,epsilon,delta) for one verb over all three transitivity categories,
+#   using NumPy arrays instead of Python loops over (n1, k1) tuples.
+#This is a drop-in replacement for the summation in likelihoods.py: it evaluates the same
+#   Equations (8)-(11) in Perkins, Feldman & Lidz, but builds the whole (n1, k1) grid of
+#   log terms at once and shares one k0 grid and one noise vector between the three categories.
+#verb: a 2-element list. The first element contains counts of direct objects
+#   and the second contains total number of observations
+#Delta: a value from 0 to 1
+#Epsilon: a value from 0 to 1
+#logfactorials: optional array of log(m!) for m in range(0, N+1), with N >= n, such as
+#   gammas.logfactorials from log_choose.py. If not given, it is built for this verb.
+#Agreement with the summation in likelihoods.py: all three log likelihoods match
+#   to within 1e-9 (absolute, in log space) for finite values, and -inf where the
+#   summation returns -inf.
+#Returns a 3-element vector of log likelihoods of the given verb over three verb categories
+#vectorized_theta_likelihood returns the same sum for a given theta instead of a category,
+#   p(k|theta, epsilon, delta) with p(k1|n1) = Binomial(n1, theta), as a log likelihood
+
+import numpy as np
+from log_choose import log_factorials
+
+## count*log(p), with the convention that 0*log(0) = 0
+def xlogp(count, p):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count == 0, 0.0, count*np.log(p))
+
+## numerically stable log(sum(exp(a))) along an axis
+## subtracts the largest value before exponentiating, as in likelihoods.py,
+## and returns -inf where every entry is -inf
+def logsumexp(a, axis=None):
+    amax = np.max(a, axis=axis, keepdims=True)
+    amax = np.where(np.isfinite(amax), amax, 0.0)
+    with np.errstate(divide='ignore'):
+        result = np.log(np.sum(np.exp(a - amax), axis=axis, keepdims=True)) + amax
+    if axis is None:
+        return result.reshape(())
+    return np.squeeze(result, axis=axis)
+
+## the grids shared by all three categories: k0term[n1, k1] = log p(k-k1|n-n1, delta) (Equation (9))
+## and noise[n1] = log p(n1|epsilon) (Equation (11))
+def log_term_grids(verb, delta, epsilon, logfactorials=None):
+
+    k = verb[0]
+    n = verb[1]
+
+    if logfactorials is None:
+        logfactorials = log_factorials(n)
+
+    ## column vector of n1 values and row vector of k1 values
+    n1 = np.arange(n+1)[:, None]
+    k1 = np.arange(k+1)[None, :]
+    n0 = n - n1
+    k0 = k - k1
+
+    ## Equation (9): p(k0|n0, delta), in log space, for every (n1, k1) cell at once
+    possible = k0 <= n0
+    safe = np.where(possible, n0 - k0, 0)
+    k0term = logfactorials[n0] - logfactorials[k0] - logfactorials[safe] + xlogp(k0, delta) + xlogp(safe, 1-delta)
+    k0term = np.where(possible, k0term, float('-inf'))
+
+    ## Equation (11): p(n1|epsilon), in log space, shared by all three categories
+    n1 = n1[:, 0]
+    noise = logfactorials[n] - logfactorials[n1] - logfactorials[n-n1] + xlogp(n1, 1-epsilon) + xlogp(n-n1, epsilon)
+
+    return k0term, noise
+
+def vectorized_likelihoods(verb, delta, epsilon, logfactorials=None):
+
+    k = verb[0]
+    n = verb[1]
+
+    k0term, noise = log_term_grids(verb, delta, epsilon, logfactorials)
+    n1 = np.arange(n+1)
+    k1 = np.arange(k+1)[None, :]
+
+    ## inner sums of Equation (8), one value per n1, for each category
+    ## T1: p(k1|n1) = 1 only if k1 = n1, so the inner sum is the single cell (n1, n1)
+    T1inner = np.full(n+1, float('-inf'))
+    T1inner[:min(n, k)+1] = k0term[np.arange(min(n, k)+1), np.arange(min(n, k)+1)]
+
+    ## T2: p(k1|n1) = 1 only if k1 = 0, so the inner sum is the cell (n1, 0)
+    T2inner = k0term[:, 0]
+
+    ## T3: p(k1|n1) = 1/(n1+1) for every k1 <= n1
+    T3terms = np.where(k1 <= n1[:, None], k0term, float('-inf'))
+    T3inner = logsumexp(T3terms, axis=1) - np.log(n1+1)
+
+    ## outer sum of Equation (8) for each category
+    Tlikelihood = [float(logsumexp(inner + noise)) for inner in (T1inner, T2inner, T3inner)]
+
+    return Tlikelihood
+
+def vectorized_theta_likelihood(verb, delta, epsilon, theta, logfactorials=None):
+
+    k = verb[0]
+    n = verb[1]
+
+    if logfactorials is None:
+        logfactorials = log_factorials(n)
+
+    k0term, noise = log_term_grids(verb, delta, epsilon, logfactorials)
+    n1 = np.arange(n+1)[:, None]
+    k1 = np.arange(k+1)[None, :]
+
+    ## p(k1|n1, theta) for every k1 <= n1
+    possible = k1 <= n1
+    safe = np.where(possible, n1 - k1, 0)
+    k1term = logfactorials[n1] - logfactorials[k1] - logfactorials[safe] + xlogp(k1, theta) + xlogp(safe, 1-theta)
+    inner = logsumexp(np.where(possible, k1term + k0term, float('-inf')), axis=1)
+
+    return float(logsumexp(inner + noise))